@@ -0,0 +1,84 @@
+"""
+This file contains the implementation of the BatchStatistics class
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+
+
+class BatchStatistics:
+    """
+    Histogram of the micro-batch sizes of the classification system, with the time
+    the first session of each batch waited for the batch to fill.
+    Batches are recorded in memory only; a background thread exports the statistics
+    as JSON every `export_interval` seconds, if they changed, so that the file I/O
+    never delays the classification loop
+    """
+
+    def __init__(self, path: str, export_interval: float = 5.0):
+        self.path = path
+        self.export_interval = export_interval
+        self.histogram = Counter()  # batch size -> number of batches
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self._lock = threading.Lock()
+        self._changed = False
+        self._exporter = None
+
+    def record(self, batch_size: int, wait_ms: float) -> None:
+        """
+        Records a classified batch
+        """
+        with self._lock:
+            self.histogram[batch_size] += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self._changed = True
+
+    def start(self) -> None:
+        """
+        Starts the background export of the statistics
+        """
+        if self._exporter is None:
+            self._exporter = threading.Thread(target=self._export_periodically, daemon=True)
+            self._exporter.start()
+
+    def _export_periodically(self) -> None:
+        stop = threading.Event()  # Never set, the thread ends with the process
+        while not stop.wait(self.export_interval):
+            self.export()
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current statistics
+        """
+        with self._lock:
+            histogram = dict(self.histogram)
+            total_wait_ms, max_wait_ms = self.total_wait_ms, self.max_wait_ms
+            self._changed = False
+        batches = sum(histogram.values())
+        sessions = sum(size * count for size, count in histogram.items())
+        return {
+            "batches": batches,
+            "sessions": sessions,
+            "meanBatchSize": sessions / batches if batches else 0,
+            "meanWaitMilliseconds": total_wait_ms / batches if batches else 0,
+            "maxWaitMilliseconds": max_wait_ms,
+            "batchSizeHistogram": {str(size): histogram[size] for size in sorted(histogram)}
+        }
+
+    def export(self, force: bool = False) -> None:
+        """
+        Writes the statistics if they changed since the last export (or if forced),
+        replacing the previous file atomically
+        """
+        if not (self._changed or force):
+            return
+        data = self.snapshot()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -1,10 +1,12 @@
 """
 Main File of the Classification System package
 """
+import threading
 import time
-import joblib
 
+from classification_system.batch_statistics import BatchStatistics
 from classification_system.flow_classification import FlowClassification
+from classification_system.model_holder import ModelHolder
 from shared.message_counter import PhaseMessageCounter
 from shared.systemsio import SystemsIO, Endpoint
 from shared.loader import load_and_validate_json_file
@@ -19,6 +21,8 @@ class ClassificationSystemController:
         2. classification of  the prepared session received by the preparation system
     """
 
+    CONFIG_PATH = "classification_system/json/config.json"
+    CONFIG_SCHEMA = "classification_system/json/config.schema.json"
     SHARED_CONFIG_PATH = "shared/json/shared_config.json"
     SHARED_CONFIG_SCHEMA = "shared/json/shared_config.schema.json"
     PREPARED_SESSION_SCHEMA = "classification_system/json/prepared_session.schema.json"
@@ -28,7 +32,10 @@ class ClassificationSystemController:
     EVALUATION_ENDPOINT = "/predicted-label"
     TIMESTAMP_ENDPOINT = "/timestamp"
 
+    BATCH_STATISTICS_PATH = "classification_system/state/batch_statistics.json"
+
     def __init__(self):
+        config = load_and_validate_json_file(self.CONFIG_PATH, self.CONFIG_SCHEMA)
         shared_config = load_and_validate_json_file(
             self.SHARED_CONFIG_PATH,
             self.SHARED_CONFIG_SCHEMA
@@ -49,6 +56,7 @@ class ClassificationSystemController:
         self.io = SystemsIO(endpoints, port=self.classification_system_address.port)
         self.is_development = shared_config['systemPhase']['developmentPhase']
         self.flow = FlowClassification()
+        self.model_holder = ModelHolder()
         self.service_flag = shared_config['serviceFlag']
         evaluation_window = shared_config['systemPhase']['evaluationPhaseWindow']
         production_window = shared_config['systemPhase']['productionPhaseWindow']
@@ -57,17 +65,105 @@ class ClassificationSystemController:
             evaluation_window,
             production_window
         )
+        self.micro_batch = config['microBatch']['enabled']
+        self.max_batch_size = config['microBatch']['maxBatchSize']
+        self.max_batch_delay = config['microBatch']['maxDelayMilliseconds'] / 1000
+        self.batch_statistics = BatchStatistics(
+            self.BATCH_STATISTICS_PATH,
+            config['microBatch']['statisticsExportSeconds']
+        )
+
+    def _deploy_classifiers(self):
+        """
+        Deploys the classifiers received during the production phase,
+        swapping them in without interrupting the classification of the sessions
+        """
+        while True:
+            filename = self.io.receive(self.INPUT_CLASSIFIER_ENDPOINT)[0]
+            try:
+                self.model_holder.swap(self.flow.deploy(filename))
+            except (OSError, ValueError, TypeError) as e:
+                print(f"[ClassificationSystem] Deployment of {filename} failed: {e}")
+
+    @staticmethod
+    def _is_duplicate(prepared_session):
+        """
+        Whether the preparation system marked the session as a duplicate:
+        its original was already classified, so it is neither classified nor
+        sent to the evaluation system again
+        """
+        if prepared_session.get("duplicate", False):
+            print(f"[ClassificationSystem] Duplicate session {prepared_session['uuid']} skipped")
+            return True
+        return False
+
+    def _receive_session(self):
+        """
+        Blocks until a prepared session that is not a duplicate is received
+        """
+        while True:
+            prepared_session = self.io.receive(self.INPUT_PREPARED_SESSION_ENDPOINT)
+            if not self._is_duplicate(prepared_session):
+                return prepared_session
+
+    def _receive_batch(self):
+        """
+        Blocks until a prepared session is received, then collects the following
+        ones until the batch is full or the first session waited the maximum delay.
+        Duplicate sessions are skipped
+        """
+        batch = [self._receive_session()]
+        first_received = time.monotonic()
+        deadline = first_received + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            prepared_session = self.io.receive(self.INPUT_PREPARED_SESSION_ENDPOINT, remaining)
+            if prepared_session is None:
+                break
+            if not self._is_duplicate(prepared_session):
+                batch.append(prepared_session)
+        wait_ms = (time.monotonic() - first_received) * 1000
+        return batch, wait_ms
+
+    def _send_label(self, prepared_session, out_label):
+        """
+        Sends the label of a classified session to the evaluation system,
+        or its timestamp to the simulator, depending on the current phase
+        """
+        if self.counter.register_message():
+            data = {
+                'uuid': prepared_session['uuid'],
+                'label': out_label.value
+            }
+            self.io.send_json(self.evaluation_system_address, self.EVALUATION_ENDPOINT, data)
+        else:
+            self.io.send_json(
+                self.simulator_system_address,
+                self.TIMESTAMP_ENDPOINT,
+                {'timestamp': int(time.time() * 1000)}
+            )
+
+        print(f"[TO CLIENT_SIDE SYSTEM] label: {out_label.value}")
 
     def run(self):
         """
         Method to run the classification system controller;
         if the system is in development phase, a new classifier will be developed,
         else it will list for a prepared session to be classified.
+        With micro-batching, the sessions received within the configured delay are
+        classified together, up to the configured batch size.
         """
+        if not self.is_development:
+            threading.Thread(target=self._deploy_classifiers, daemon=True).start()
+            if self.micro_batch:
+                self.batch_statistics.start()
         while True:
             if self.is_development:
                 filename = self.io.receive(self.INPUT_CLASSIFIER_ENDPOINT)[0]
                 model = self.flow.deploy(filename)
+                self.model_holder.swap(model)
                 print("[TO CLIENT_SIDE SYSTEM]")
                 print(f"Model loaded from: {filename}")
                 print(f"Model type: {type(model).__name__}")
@@ -82,27 +178,21 @@ class ClassificationSystemController:
                     return
                 continue
 
-            model = joblib.load("classification_system/state/saved_model.joblib")
-
-            prepared_session = self.io.receive(self.INPUT_PREPARED_SESSION_ENDPOINT)
-            out_label = self.flow.classify(model, prepared_session)
-
-            if self.counter.register_message():
-                data = {
-                    'uuid': prepared_session['uuid'],
-                    'label': out_label.value
-                }
-                self.io.send_json(self.evaluation_system_address, self.EVALUATION_ENDPOINT, data)
+            if self.micro_batch:
+                batch, wait_ms = self._receive_batch()
+                engine = self.model_holder.get()
+                out_labels = self.flow.classify_batch(engine, batch)
+                self.batch_statistics.record(len(batch), wait_ms)
+                for prepared_session, out_label in zip(batch, out_labels):
+                    self._send_label(prepared_session, out_label)
             else:
-                self.io.send_json(
-                    self.simulator_system_address,
-                    self.TIMESTAMP_ENDPOINT,
-                    {'timestamp': int(time.time() * 1000)}
-                )
-
-            print(f"[TO CLIENT_SIDE SYSTEM] label: {out_label.value}")
+                prepared_session = self._receive_session()
+                engine = self.model_holder.get()
+                self._send_label(prepared_session, self.flow.classify(engine, prepared_session))
 
             if not self.service_flag:
+                if self.micro_batch:
+                    self.batch_statistics.export()
                 break
 
 
@@ -3,12 +3,14 @@ This file contains the implementation of the FlowClassification class
 """
 
 import os
+import shutil
 
-import pandas as pd
 from sklearn.neural_network import MLPClassifier
 import joblib
 
+from classification_system.inference_engine import InferenceEngine
 from shared.attack_risk_level import AttackRiskLevel
+from shared.compact_model import CompactModel
 
 
 class FlowClassification:
@@ -17,48 +19,96 @@ class FlowClassification:
     This class implements the deploy and classify methods,
     which are called from the Classification System Controller,
     depending on the operating phase.
+    Classifiers are either pickled MLPClassifiers (.joblib) or compact models (.npz)
     """
 
+    STATE_DIR = "classification_system/state"
+    SAVED_MODEL_PATHS = (
+        "classification_system/state/saved_model.npz",
+        "classification_system/state/saved_model.joblib"
+    )
+
     @staticmethod
-    def deploy(filename: str) -> MLPClassifier:
+    def deploy(filename: str) -> MLPClassifier | CompactModel:
         """
-        Deserialize the received binary file into a MLPClassifier python class
+        Deserialize the received binary file into a MLPClassifier python class,
+        or into a CompactModel for .npz files, and saves it as the deployed model
         :param filename:
         :return:
         """
-        model = joblib.load(filename)
-        if not isinstance(model, MLPClassifier):
-            raise TypeError("Loaded object is not an MLPClassifier")
-        os.makedirs("classification_system/state", exist_ok=True)
-        joblib.dump(model, "classification_system/state/saved_model.joblib")
+        os.makedirs(FlowClassification.STATE_DIR, exist_ok=True)
+        if filename.endswith(".npz"):
+            model = CompactModel.load(filename)
+            saved_path, stale_path = FlowClassification.SAVED_MODEL_PATHS
+        else:
+            model = joblib.load(filename)
+            if not isinstance(model, MLPClassifier):
+                raise TypeError("Loaded object is not an MLPClassifier")
+            stale_path, saved_path = FlowClassification.SAVED_MODEL_PATHS
+        # The received file is already in the deployed format: it is copied to a
+        # temporary file and renamed, so readers never see a partially written model
+        tmp_path = f"{saved_path}.tmp"
+        shutil.copyfile(filename, tmp_path)
+        os.replace(tmp_path, saved_path)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
         return model
 
     @staticmethod
-    def classify(model: MLPClassifier, prepared_session: dict) -> AttackRiskLevel:
+    def load_model() -> MLPClassifier | CompactModel:
+        """
+        Loads the deployed model, whatever its format
+        """
+        compact_path, pickle_path = FlowClassification.SAVED_MODEL_PATHS
+        if os.path.exists(compact_path):
+            return CompactModel.load(compact_path)
+        return joblib.load(pickle_path)
+
+    @staticmethod
+    def _to_risk_level(raw_result: str) -> AttackRiskLevel:
+        """
+        Converts a predicted label into an AttackRiskLevel, NORMAL if unknown
+        """
+        try:
+            return AttackRiskLevel(raw_result)
+        except ValueError:
+            print(f"Warning: Unknown classification label '{raw_result}'")
+            return AttackRiskLevel.NORMAL
+
+    @staticmethod
+    def classify(model: InferenceEngine | MLPClassifier | CompactModel,
+                 prepared_session: dict) -> AttackRiskLevel:
         """
         Classifies the given features using the provided MLP model.
 
-        :param model: The trained MLPClassifier.
+        :param model: The inference engine of the deployed model, or the model itself.
         :param prepared_session: A PreparedSession dict.
         :return: The corresponding AttackRiskLevel.
         """
 
-        expected_features = model.feature_names_in_
-
-        df = pd.DataFrame([prepared_session])
+        engine = model if isinstance(model, InferenceEngine) else InferenceEngine(model)
 
         try:
-            x_pred = df[expected_features]
+            raw_result = engine.predict_session(prepared_session)
         except KeyError:
-            print(f"No features were provided for {expected_features}")
+            print(f"No features were provided for {engine.feature_names}")
             return AttackRiskLevel.NORMAL
 
-        prediction = model.predict(x_pred)[0]
+        return FlowClassification._to_risk_level(raw_result)
 
-        raw_result = list(AttackRiskLevel)[int(prediction)]
+    @staticmethod
+    def classify_batch(engine: InferenceEngine,
+                       prepared_sessions: list[dict]) -> list[AttackRiskLevel]:
+        """
+        Classifies a batch of prepared sessions with a single forward pass.
+        If a session lacks some feature, the sessions are classified one by one
 
+        :param engine: The inference engine of the deployed model.
+        :param prepared_sessions: A list of PreparedSession dicts.
+        :return: The AttackRiskLevel of each session.
+        """
         try:
-            return AttackRiskLevel(raw_result)
-        except ValueError:
-            print(f"Warning: Unknown classification label '{raw_result}'")
-            return AttackRiskLevel.NORMAL
+            raw_results = engine.predict_sessions(prepared_sessions)
+        except KeyError:
+            return [FlowClassification.classify(engine, s) for s in prepared_sessions]
+        return [FlowClassification._to_risk_level(raw) for raw in raw_results]
@@ -0,0 +1,96 @@
+"""
+Compares the per-session classification latency of the sklearn path (one-row
+DataFrame and `predict`) with the NumPy inference engine, single-row and batched,
+for a pickled MLPClassifier and its compact export.
+
+Usage (from the repository root):
+
+    python -m classification_system.inference_benchmark --sessions 5000
+
+The model is trained on synthetic prepared sessions; the predictions of the engine
+are checked against `predict` before timing.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neural_network import MLPClassifier
+
+from classification_system.inference_engine import InferenceEngine
+from segregation_system.calibration_set_benchmark import generate_sessions
+from shared.compact_model import CompactModel
+
+
+def train_model(sessions: pd.DataFrame) -> MLPClassifier:
+    """
+    Trains a classifier with the default hidden layers of the development system
+    """
+    model = MLPClassifier(hidden_layer_sizes=(32, 32), max_iter=50, random_state=42)
+    return model.fit(sessions.drop(columns=["uuid", "label"]), sessions["label"])
+
+
+def sklearn_latency(model, records: list[dict]) -> float:
+    """
+    Returns the mean latency of the sklearn path, in microseconds per session
+    """
+    start = time.perf_counter()
+    for record in records:
+        model.predict(pd.DataFrame([record])[model.feature_names_in_])
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+
+def engine_latency(engine: InferenceEngine, records: list[dict]) -> float:
+    """
+    Returns the mean single-row latency of the engine, in microseconds per session
+    """
+    start = time.perf_counter()
+    for record in records:
+        engine.predict_session(record)
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+
+def batch_latency(engine: InferenceEngine, records: list[dict], batch_size: int) -> float:
+    """
+    Returns the mean batched latency of the engine, in microseconds per session
+    """
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        engine.predict_sessions(records[i:i + batch_size])
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+
+def main() -> None:
+    """
+    Entry point of the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Classification inference benchmark")
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    sessions = generate_sessions(args.sessions)
+    mlp = train_model(sessions)
+    compact = CompactModel.from_mlp(mlp)
+    records = sessions.drop(columns=["label"]).to_dict("records")
+    x = sessions[mlp.feature_names_in_]
+
+    results = {}
+    for name, model in (("MLPClassifier", mlp), ("CompactModel", compact)):
+        engine = InferenceEngine(model)
+        if not np.array_equal(engine.predict_sessions(records), model.predict(x)):
+            raise AssertionError(f"Engine predictions differ from {name}.predict")
+        results[name] = (sklearn_latency(model, records), engine_latency(engine, records),
+                         batch_latency(engine, records, args.batch_size))
+
+    print(f"\n--- INFERENCE BENCHMARK ({args.sessions} sessions, microseconds/session) ---")
+    print(f"{'model':<16}{'sklearn':>10}{'engine':>10}{'batch ' + str(args.batch_size):>12}"
+          f"{'speedup':>10}")
+    for name, (base, single, batch) in results.items():
+        print(f"{name:<16}{base:>10.1f}{single:>10.1f}{batch:>12.2f}{base / single:>9.1f}x")
+    print("-----------------------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+This file contains the implementation of the InferenceEngine class
+"""
+
+from operator import itemgetter
+
+import numpy as np
+from sklearn.neural_network import MLPClassifier
+
+from shared.attack_risk_level import AttackRiskLevel
+from shared.compact_model import ACTIVATIONS, CompactModel
+
+
+class InferenceEngine:
+    """
+    Forward pass of a deployed classifier with plain NumPy matrix products.
+    The weights, the labels and the order of the features are extracted once from
+    the model, so classifying a prepared session skips the DataFrame construction
+    and the input validation of sklearn. Predictions are identical to `model.predict`:
+    the same dtype (float64 for MLPClassifier, float32 for CompactModel) and the same
+    operations are used
+
+    :ivar model: The wrapped model
+    :type model: MLPClassifier | CompactModel
+    :ivar feature_names: The input features, in the order expected by the first layer
+    :type feature_names: list[str]
+    :ivar labels: The label of each output unit
+    :type labels: np.ndarray
+    """
+
+    def __init__(self, model: MLPClassifier | CompactModel):
+        self.model = model
+        if isinstance(model, CompactModel):
+            self.dtype = np.float32
+            self.weights, self.biases = model.weights, model.biases
+            self.labels = np.asarray(model.classes_, dtype=object)
+            self.out_activation = model.out_activation
+        else:
+            self.dtype = np.float64
+            self.weights, self.biases = model.coefs_, model.intercepts_
+            self.labels = self._mlp_labels(model)
+            self.out_activation = model.out_activation_
+        self.hidden_activation = ACTIVATIONS[model.activation]
+        self.output_activation = ACTIVATIONS[self.out_activation]
+        self.feature_names = [str(name) for name in model.feature_names_in_]
+        self._features = itemgetter(*self.feature_names)
+
+    @staticmethod
+    def _mlp_labels(model: MLPClassifier) -> np.ndarray:
+        """
+        Returns the label of each class of a MLPClassifier
+        """
+        encoder = getattr(model, "label_encoder_", None)
+        if encoder is not None:
+            return np.asarray(encoder.inverse_transform(model.classes_), dtype=object)
+        if model.classes_.dtype.kind in "iu":
+            # Classifiers trained on the ordinal of the label
+            levels = list(AttackRiskLevel)
+            return np.array([levels[int(c)].value for c in model.classes_], dtype=object)
+        return np.asarray(model.classes_, dtype=object)
+
+    def vectorize(self, prepared_sessions: list[dict]) -> np.ndarray:
+        """
+        Returns the feature matrix of some prepared sessions.
+        Raises KeyError if a feature is missing
+        """
+        rows = [self._features(session) for session in prepared_sessions]
+        x = np.array(rows, dtype=self.dtype)
+        return x.reshape(len(prepared_sessions), len(self.feature_names))
+
+    def predict_proba(self, x: np.ndarray) -> np.ndarray:
+        """
+        Returns the output of the network for a feature matrix
+        """
+        a = x
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            a = a @ w
+            a += b
+            a = self.hidden_activation(a)
+        a = a @ self.weights[-1]
+        a += self.biases[-1]
+        return self.output_activation(a)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """
+        Returns the label of each row of a feature matrix
+        """
+        proba = self.predict_proba(x)
+        if proba.shape[1] == 1:
+            # Binary classifier, thresholded as in MLPClassifier
+            return self.labels[(proba[:, 0] > 0.5).astype(int)]
+        return self.labels[np.argmax(proba, axis=1)]
+
+    def predict_sessions(self, prepared_sessions: list[dict]) -> np.ndarray:
+        """
+        Returns the label of each prepared session
+        """
+        return self.predict(self.vectorize(prepared_sessions))
+
+    def predict_session(self, prepared_session: dict) -> str:
+        """
+        Returns the label of a single prepared session
+        """
+        x = np.array(self._features(prepared_session), dtype=self.dtype).reshape(1, -1)
+        return self.predict(x)[0]
@@ -0,0 +1,67 @@
+"""
+This file contains the implementation of the ModelHolder class
+"""
+
+import os
+import threading
+
+from sklearn.neural_network import MLPClassifier
+
+from classification_system.flow_classification import FlowClassification
+from classification_system.inference_engine import InferenceEngine
+from shared.compact_model import CompactModel
+
+
+class ModelHolder:
+    """
+    Keeps the deployed classifier resident in memory, so that it is loaded once
+    instead of once per prepared session, wrapped in its inference engine.
+    A new model is swapped in atomically, either explicitly after a deployment or
+    when the deployed model file changes on disk. Classifications already in progress
+    keep using the model they obtained, so no request is dropped during a swap
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._signature = None  # (path, mtime, size) of the loaded model file
+
+    @staticmethod
+    def _deployed_signature():
+        """
+        Returns the (path, mtime, size) of the deployed model file, or None
+        """
+        for path in FlowClassification.SAVED_MODEL_PATHS:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return path, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def swap(self, model: MLPClassifier | CompactModel) -> None:
+        """
+        Replaces the resident model with a newly deployed one
+        """
+        signature = self._deployed_signature()
+        engine = InferenceEngine(model)
+        with self._lock:
+            self._engine = engine
+            self._signature = signature
+        print("[ModelHolder] Deployed model swapped in")
+
+    def get(self) -> InferenceEngine:
+        """
+        Returns the engine of the resident model, reloading it only if the deployed
+        file changed
+        """
+        signature = self._deployed_signature()
+        if self._engine is not None and signature == self._signature:
+            return self._engine
+        with self._lock:
+            # Another thread may have reloaded it in the meantime
+            if self._engine is None or signature != self._signature:
+                self._engine = InferenceEngine(FlowClassification.load_model())
+                self._signature = signature
+                print(f"[ModelHolder] Model loaded from: {signature[0]}")
+            return self._engine
@@ -4,28 +4,41 @@ This file contains the implementation of the CalibrationView class
 
 from random import random
 import os
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
 
 class CalibrationView:
     """
     Handles the calibration report.
+    Figures are built with the object-oriented matplotlib API, without the global
+    pyplot state, so that concurrent development jobs can build their reports
     """
-    @staticmethod
-    def build_report(loss_curve):
+    def __init__(self, plot_name="calibration_plot"):
+        self.plot_name = plot_name
+
+    def build_report(self, loss_curve, validation_loss_curve=None):
         """
         Build the calibration report.
+        With automatic iteration selection, the validation loss of every trained epoch
+        is plotted too, and the selected iteration is marked.
         """
         print("\n--- CALIBRATION REPORT ---")
-        plt.figure()
-        plt.plot(range(1, len(loss_curve) + 1), loss_curve, label='Calibration plot')
-        plt.xlabel('Training Iteration')
-        plt.ylabel('Validation Loss')
-        plt.title('Training Loss Curve')
-        plt.legend()
+        fig = Figure()
+        ax = fig.subplots()
+        ax.plot(range(1, len(loss_curve) + 1), loss_curve, label='Calibration plot')
+        if validation_loss_curve is not None:
+            ax.plot(range(1, len(validation_loss_curve) + 1), validation_loss_curve,
+                    label='Validation loss')
+            ax.axvline(len(loss_curve), color='gray', linestyle='--',
+                       label=f'Selected iterations ({len(loss_curve)})')
+            print(f"Selected iterations: {len(loss_curve)} "
+                  f"(trained {len(validation_loss_curve)})")
+        ax.set_xlabel('Training Iteration')
+        ax.set_ylabel('Validation Loss')
+        ax.set_title('Training Loss Curve')
+        ax.legend()
         os.makedirs("development_system/plot", exist_ok=True)
-        plt.savefig("development_system/plot/calibration_plot.png")
-        plt.close()
+        fig.savefig(f"development_system/plot/{self.plot_name}.png")
         print("--------------------------")
 
     @staticmethod
@@ -0,0 +1,97 @@
+"""
+This file contains the implementation of the CandidateStore class
+"""
+
+import os
+import shutil
+
+from joblib import dump, load
+
+
+class CandidateStore:
+    """
+    List-like store of the trained candidate models, indexed by model id.
+    Every model is spilled to disk when added; only a few stay resident in memory,
+    the others are loaded back lazily when accessed.
+    Eviction keeps the models with the lowest validation error (the most recently
+    added ones until they are scored), within a number of models and a memory ceiling
+    """
+    STORE_DIR = "development_system/candidates"
+
+    def __init__(self, max_resident=5, memory_limit_mb=256, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.max_resident = max_resident
+        self.memory_limit = memory_limit_mb * 2**20
+        self.sizes = []  # id -> size of the serialized model, in bytes
+        self.scores = []  # id -> validation error, None until validated
+        self.resident = {}  # id -> model
+        # Candidates of a previous development flow are never reused
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _path(self, model_id):
+        return os.path.join(self.store_dir, f"candidate.{model_id}.joblib")
+
+    def _priority(self, model_id):
+        """
+        Sort key of the resident models, the last one is evicted first:
+        unscored models from the oldest, then scored models from the worst
+        """
+        score = self.scores[model_id]
+        return (score is None, -model_id if score is None else score)
+
+    def _evict(self, keep=None):
+        """
+        Drops resident models until both the count and memory limits are respected.
+        The `keep` model, just added or accessed, is never dropped
+        """
+        while len(self.resident) > 1 and (
+                len(self.resident) > self.max_resident
+                or sum(self.sizes[i] for i in self.resident) > self.memory_limit):
+            victim = max((i for i in self.resident if i != keep), key=self._priority)
+            del self.resident[victim]
+
+    def append(self, model):
+        """
+        Adds a trained model, with the next id
+        """
+        model_id = len(self.sizes)
+        path = self._path(model_id)
+        dump(model, path)
+        self.sizes.append(os.path.getsize(path))
+        self.scores.append(None)
+        self.resident[model_id] = model
+        self._evict(keep=model_id)
+
+    def set_score(self, model_id, validation_error):
+        """
+        Records the validation error of a model, used by the eviction policy
+        """
+        self.scores[model_id] = validation_error
+        self._evict()
+
+    def __getitem__(self, model_id):
+        if not 0 <= model_id < len(self.sizes):
+            raise IndexError(f"Candidate {model_id} does not exist")
+        model = self.resident.get(model_id)
+        if model is None:
+            model = load(self._path(model_id))
+            self.resident[model_id] = model
+            self._evict(keep=model_id)
+        return model
+
+    def clear(self):
+        """
+        Deletes every stored model
+        """
+        self.sizes.clear()
+        self.scores.clear()
+        self.resident.clear()
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        for model_id in range(len(self)):
+            yield self[model_id]
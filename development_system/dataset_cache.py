@@ -0,0 +1,100 @@
+"""
+This file contains the implementation of the DatasetCache class
+"""
+
+from collections import OrderedDict
+import hashlib
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class DatasetCache:
+    """
+    Cache of the loaded calibration sets, so that a set is parsed and label encoded
+    once instead of on every training run.
+    Entries are keyed by path, modification time and size, so a file received again
+    under the same name is reloaded. Features are held as contiguous float32 arrays
+    and labels as int8 codes, both memory mapped from .npy files: worker processes
+    of a parallel grid search map the same pages instead of receiving a copy.
+    Calibration sets already in the binary format are mapped from their own file.
+    """
+    CACHE_DIR = "development_system/cache"
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=8):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # path -> (key, features DataFrame, labels Series)
+        self.hits = 0
+        self.misses = 0
+        self._cleared = False
+        # Jobs running concurrently share the cache
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path):
+        """
+        Returns the cache key of a calibration set file
+        """
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _file_prefix(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest()[:16])
+
+    def _map(self, key, x, y):
+        """
+        Stores the features and labels as .npy files and maps them back
+        """
+        if not self._cleared:
+            # Files left by a previous process are never reused. Not done at construction,
+            # since worker processes also build a (never used) cache when importing
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._cleared = True
+        os.makedirs(self.cache_dir, exist_ok=True)
+        prefix = self._file_prefix(key)
+        np.save(f"{prefix}.x.npy", np.ascontiguousarray(x.to_numpy(dtype=np.float32)))
+        np.save(f"{prefix}.y.npy", y.to_numpy(dtype=np.int8))
+        features = np.load(f"{prefix}.x.npy", mmap_mode="r")
+        labels = np.load(f"{prefix}.y.npy", mmap_mode="r")
+        return (pd.DataFrame(features, columns=x.columns, copy=False),
+                pd.Series(labels, name=y.name, copy=False))
+
+    def _evict(self, path):
+        key, _, _ = self.entries.pop(path)
+        prefix = self._file_prefix(key)
+        for suffix in (".x.npy", ".y.npy"):
+            # Mapped pages stay valid for the models still holding them
+            if os.path.exists(prefix + suffix):
+                os.remove(prefix + suffix)
+
+    def get(self, path, loader):
+        """
+        Returns the (features, labels) of a calibration set,
+        calling `loader(path)` only if it is not cached
+        """
+        with self._lock:
+            return self._get(path, loader)
+
+    def _get(self, path, loader):
+        key = self.key(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            self.entries.move_to_end(path)
+            return entry[1], entry[2]
+
+        self.misses += 1
+        if entry is not None:
+            self._evict(path)
+        x, y = loader(path)
+        if not path.endswith(".npz"):
+            x, y = self._map(key, x, y)
+        self.entries[path] = (key, x, y)
+        while len(self.entries) > self.max_entries:
+            self._evict(next(iter(self.entries)))
+        print(f"[DatasetCache] Cached {path} ({self.hits} hits, {self.misses} misses)")
+        return x, y
@@ -0,0 +1,118 @@
+"""
+This file contains the implementation of the DevelopmentJob class
+"""
+
+import os
+import time
+
+from joblib import cpu_count
+
+from development_system.neural_network import NeuralNetwork
+from development_system.test_controller import TestController
+from development_system.training_controller import TrainingController
+from development_system.validation_controller import ValidationController
+
+
+# pylint: disable=too-many-instance-attributes
+class DevelopmentJob:
+    """
+    The development flow (training, validation and test) of one received calibration set.
+    Every job has its own state, neural network and controllers, so that jobs of
+    different sources can run concurrently.
+    The source is the stable key of the segregation system that produced the sets,
+    in their file names (train_set.<source>.<splits id>.<format>)
+    """
+    DEFAULT_SOURCE = "default"
+
+    def __init__(self, files, config, parent, config_path):
+        self.train_set = next((f for f in files if "train_set" in f), None)
+        self.validation_set = next((f for f in files if "validation_set" in f), None)
+        self.test_set = next((f for f in files if "test_set" in f), None)
+        self.source, self.split_id = (self.parse_set_name(self.test_set) if self.test_set
+                                      else (None, None))
+        self.received_at = time.monotonic()
+        self.config = config
+        self.service_flag = parent.service_flag
+        self.classification_address = parent.classification_address
+        self.training_cache = parent.training_cache
+        self.n_jobs = self.worker_count(config["parallelJobs"], parent.max_concurrent_jobs)
+        # Built when the job runs, a pending job must not touch the candidates on disk
+        self.neural_network = None
+        self.valid_classifier_exists = False
+        self.iterations_fine = False
+        self.valid_classifier_id = None
+        # Init controllers
+        self.training_ctrl = TrainingController(self)
+        self.validation_ctrl = ValidationController(self)
+        # The test rewrites the hyperparameter ranges in the configuration file
+        self.test_ctrl = TestController(self, config_path)
+
+    @classmethod
+    def parse_set_name(cls, path):
+        """
+        Returns the (source, splits id) of a calibration set file.
+        Sets named without a source (train_set.<splits id>.<format>) get the default one
+        """
+        parts = os.path.basename(path).split(".")
+        if len(parts) >= 4:
+            return parts[1], parts[2]
+        return cls.DEFAULT_SOURCE, parts[1]
+
+    @staticmethod
+    def worker_count(parallel_jobs, concurrent_jobs):
+        """
+        Returns the training worker processes of a job: the configured ones (-1 for
+        every core) shared among the concurrent jobs, so that they do not oversubscribe
+        the cores
+        """
+        total = cpu_count() if parallel_jobs == -1 else parallel_jobs
+        return max(1, total // concurrent_jobs)
+
+    def is_complete(self):
+        """
+        Whether the train, validation and test sets were all received
+        """
+        return None not in (self.train_set, self.validation_set, self.test_set)
+
+    def neural_network_params(self):
+        """
+        Returns the candidate store and training cache parameters of the neural network
+        """
+        store_cfg = self.config["candidateStore"]
+        return {
+            "max_resident_models": store_cfg["maxResidentModels"],
+            "memory_limit_mb": store_cfg["memoryLimitMegabytes"],
+            "training_cache": self.training_cache,
+            "store_dir": f"development_system/candidates/{self.source}"
+        }
+
+    def run(self):
+        """
+        Runs the development flow on the calibration sets.
+        Returns whether the test passed and the classifier was sent
+        """
+        print(f"\n[Job {self.source}] --- DEVELOPMENT FLOW START ---")
+        # Loop: while no valid classifier
+        while not self.valid_classifier_exists:
+            self.iterations_fine = False
+            self.neural_network = NeuralNetwork(self.config["hiddenLayerSizeRange"],
+                                                self.config["hiddenNeuronPerLayerRange"],
+                                                **self.neural_network_params())
+            # 1. Training Phase
+            print(f"\n[Job {self.source}] --- TRAINING PHASE START ---")
+            # Loop: while number of iterations not fine
+            while not self.iterations_fine:
+                self.training_ctrl.run(self.train_set, self.validation_set)
+            print(f"\n[Job {self.source}] --- TRAINING PHASE END ---")
+
+            # 2. Validation Phase
+            print(f"\n[Job {self.source}] --- VALIDATION PHASE START ---")
+            self.validation_ctrl.run(self.train_set, self.validation_set)
+            print(f"\n[Job {self.source}] --- VALIDATION PHASE END ---")
+
+        # 3. Test Phase
+        print(f"\n[Job {self.source}] --- TEST PHASE START ---")
+        test_passed = self.test_ctrl.run(self.test_set)
+        print(f"\n[Job {self.source}] --- TEST PHASE END ---")
+        self.neural_network.models.clear()
+        return test_passed
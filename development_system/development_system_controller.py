@@ -2,12 +2,12 @@
 Main File of the Development System package
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import time
 import warnings
 from sklearn.exceptions import ConvergenceWarning
-from development_system.neural_network import NeuralNetwork
-from development_system.test_controller import TestController
-from development_system.training_controller import TrainingController
-from development_system.validation_controller import ValidationController
+from development_system.development_job import DevelopmentJob
+from development_system.training_cache import TrainingCache
 from shared.systemsio import SystemsIO, Endpoint
 from shared.loader import load_and_validate_json_file
 from shared.address import Address
@@ -18,14 +18,18 @@ warnings.filterwarnings("ignore", category=ConvergenceWarning)
 class DevelopmentSystemController:
     """
     Main controller of the development system.
-    Handles the sequence of all operations and the training, validation and test
-    controllers.
+    Schedules a development job (training, validation and test controllers) for every
+    received calibration set: pending jobs start newest first, a job is dropped when
+    a newer one of the same source (segregation system) is received or when it waited
+    too long, and jobs of different sources run concurrently (in service mode only, since otherwise
+    the data scientist answers the prompts of one job at a time).
     """
     CONFIG_PATH = "development_system/input/development_system_configuration.json"
     CONFIG_SCHEMA_PATH = "development_system/schema/configuration.schema.json"
     SHARED_CONFIG_PATH = "shared/json/shared_config.json"
     SHARED_CONFIG_SCHEMA_PATH = "shared/json/shared_config.schema.json"
     PROCESS_ENDPOINT = "/calibration-sets"
+    POLL_SECONDS = 0.5
 
     def __init__(self):
         self.config = load_and_validate_json_file(self.CONFIG_PATH,
@@ -41,63 +45,91 @@ class DevelopmentSystemController:
             self.shared_config["addresses"]["classificationSystem"]["ip"],
             int(self.shared_config["addresses"]["classificationSystem"]["port"])
         )
-        self.neural_network = NeuralNetwork(self.config["hiddenLayerSizeRange"],
-                                            self.config["hiddenNeuronPerLayerRange"])
-        self.valid_classifier_exists = False
-        self.iterations_fine = False
-        self.valid_classifier_id = None
-        # Init controllers
-        self.training_ctrl = TrainingController(self)
-        self.validation_ctrl = ValidationController(self)
-        self.test_ctrl = TestController(self)
+        cache_cfg = self.config["trainingCache"]
+        self.training_cache = (TrainingCache(cache_cfg["maxEntries"])
+                               if cache_cfg["enabled"] else None)
+        queue_cfg = self.config["jobQueue"]
+        self.max_concurrent_jobs = queue_cfg["maxConcurrentJobs"] if self.service_flag else 1
+        self.max_job_age = queue_cfg["maxJobAgeSeconds"]
+        self.pending_jobs = []
+        self.running_jobs = {}  # future -> job
 
-    def run(self):
+    def _receive_jobs(self, timeout):
         """
-        Main function of the development system controller.
-        Called by the user to run the development system.
+        Turns the received calibration sets into pending jobs, waiting at most
+        `timeout` seconds (None: indefinitely) for the first one
         """
-        while True:
-            # Receive Calibration Set
-            files = self.io.receive(self.PROCESS_ENDPOINT)
-            train_set = next((f for f in files if "train_set" in f), None)
-            validation_set = next((f for f in files if "validation_set" in f), None)
-            test_set = next((f for f in files if "test_set" in f), None)
-            if train_set is None or validation_set is None or test_set is None:
+        files = self.io.receive(self.PROCESS_ENDPOINT, timeout=timeout)
+        while files is not None:
+            # Jobs read the configuration when created, it may have been changed by a test
+            job = DevelopmentJob(files, load_and_validate_json_file(self.CONFIG_PATH,
+                                                                    self.CONFIG_SCHEMA_PATH),
+                                 self, self.CONFIG_PATH)
+            if job.is_complete():
+                print(f"[System] Calibration Sets received "
+                      f"(source {job.source}, splits {job.split_id}).")
+                self.pending_jobs.append(job)
+            else:
                 print("[System] A set is missing, calibration sets skipped")
-                continue
-            print("[System] Calibration Sets received.")
+            files = self.io.receive(self.PROCESS_ENDPOINT, timeout=0)
 
-            print("\n[System] --- DEVELOPMENT FLOW START ---")
-            # Loop: while no valid classifier
-            while not self.valid_classifier_exists:
-                self.iterations_fine = False
-                self.neural_network.__init__(self.config["hiddenLayerSizeRange"],
-                                             self.config["hiddenNeuronPerLayerRange"])
-                # 1. Training Phase
-                print("\n[System] --- TRAINING PHASE START ---")
-                # Loop: while number of iterations not fine
-                while not self.iterations_fine:
-                    self.training_ctrl.run(train_set)
-                print("\n[System] --- TRAINING PHASE END ---")
-
-                # 2. Validation Phase
-                print("\n[System] --- VALIDATION PHASE START ---")
-                self.validation_ctrl.run(train_set, validation_set)
-                print("\n[System] --- VALIDATION PHASE END ---")
+    def _drop_stale_jobs(self):
+        """
+        Drops the pending jobs superseded by a newer job of the same source,
+        or waiting for longer than the maximum job age (if any)
+        """
+        fresh_jobs = []
+        sources = set()
+        now = time.monotonic()
+        for job in sorted(self.pending_jobs, key=lambda j: j.received_at, reverse=True):
+            if job.source in sources:
+                print(f"[System] Job {job.source}.{job.split_id} superseded by a newer one, "
+                      "dropped")
+            elif self.max_job_age and now - job.received_at > self.max_job_age:
+                print(f"[System] Job {job.source}.{job.split_id} waited too long, dropped")
+            else:
+                sources.add(job.source)
+                fresh_jobs.append(job)
+        self.pending_jobs = fresh_jobs
 
-            # 3. Test Phase
-            print("\n[System] --- TEST PHASE START ---")
-            test_passed = self.test_ctrl.run(test_set)
-            print("\n[System] --- TEST PHASE END ---")
-            # Reset for possible re-executions
-            self.valid_classifier_exists = False
-            self.valid_classifier_id = None
-            self.validation_ctrl.ongoing_validation = False
-            if not test_passed:
-                self.config = load_and_validate_json_file(self.CONFIG_PATH,
-                                                          self.CONFIG_SCHEMA_PATH)
-            elif not self.service_flag:
+    def _start_jobs(self, executor):
+        """
+        Starts the newest pending jobs whose source has no running job,
+        up to the maximum number of concurrent jobs
+        """
+        running_sources = {job.source for job in self.running_jobs.values()}
+        for job in list(self.pending_jobs):  # Newest first
+            if len(self.running_jobs) >= self.max_concurrent_jobs:
                 break
+            if job.source in running_sources:
+                continue
+            self.pending_jobs.remove(job)
+            running_sources.add(job.source)
+            self.running_jobs[executor.submit(job.run)] = job
+
+    def run(self):
+        """
+        Main function of the development system controller.
+        Called by the user to run the development system.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_jobs) as executor:
+            while True:
+                # Blocks only when there is nothing else to wait for
+                idle = not self.pending_jobs and not self.running_jobs
+                self._receive_jobs(None if idle else 0)
+                self._drop_stale_jobs()
+                self._start_jobs(executor)
+                done, _ = wait(self.running_jobs, timeout=self.POLL_SECONDS,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = self.running_jobs.pop(future)
+                    try:
+                        test_passed = future.result()
+                    except Exception as e:  # pylint: disable=broad-exception-caught
+                        print(f"[System] Job {job.source}.{job.split_id} failed: {e}")
+                        continue
+                    if test_passed and not self.service_flag:
+                        return
 
 if __name__ == "__main__":
     controller = DevelopmentSystemController()
@@ -2,17 +2,164 @@
 This file contains the implementation of the NeuralNetwork class
 """
 
+import copy
+import math
+import os
+import pickle
+import tempfile
+import time
+import warnings
+from joblib import Parallel, delayed, parallel_config
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.metrics import log_loss
 from sklearn.neural_network import MLPClassifier
 from sklearn.preprocessing import LabelEncoder
+import numpy as np
 import pandas as pd
 
+from classification_system.inference_engine import InferenceEngine
+from shared.calibration_set import LABEL_NAMES, load_calibration_set
+from shared.compact_model import CompactModel
+from development_system.candidate_store import CandidateStore
+from development_system.dataset_cache import DatasetCache
+from development_system.training_cache import TrainingCache
+
+
+def fit_candidate(layers, neurons, iterations, x_train, y_train):
+    """
+    Trains an MLP classifier with the given hyperparameters.
+    Module level, so that it can run in a worker process
+    """
+    model = MLPClassifier(
+                          max_iter=iterations,
+                          random_state=42,
+                          hidden_layer_sizes=(neurons,) * layers,
+                          early_stopping=False,
+                          tol=0.0,  # prevents early stop due to tolerance threshold
+                          n_iter_no_change=iterations
+                          )
+    # Worker processes do not inherit the warning filters of the controller
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=ConvergenceWarning)
+        model.fit(x_train, y_train)
+    return model, 1 - model.score(x_train, y_train)
+
+
+def continue_candidate(previous, iterations, x_train, y_train):
+    """
+    Trains a copy of a model for the epochs it is missing to reach `iterations`,
+    starting from its weights. The loss curve of the copy extends the previous one
+    """
+    model = copy.deepcopy(previous)
+    model.set_params(warm_start=True, max_iter=iterations - previous.n_iter_,
+                     n_iter_no_change=iterations)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=ConvergenceWarning)
+        model.fit(x_train, y_train)
+    # fit only counts the epochs of the last call, the loss curve covers all of them
+    model.n_iter_ = len(model.loss_curve_)
+    model.set_params(warm_start=False, max_iter=iterations)
+    return model, 1 - model.score(x_train, y_train)
+
+
+def validation_loss(model, x_val, y_val):
+    """
+    Returns the log loss of a model on the validation set
+    """
+    return log_loss(y_val, model.predict_proba(x_val), labels=model.classes_)
+
+
+def exported_model(model, export_format="compact", quantize=True):
+    """
+    Returns the model as the classification system runs it, with the size of its
+    deployed file in bytes: the reloaded compact export, or the model itself
+    """
+    if export_format != "compact":
+        return model, len(pickle.dumps(model))
+    fd, path = tempfile.mkstemp(suffix=".npz")
+    os.close(fd)
+    try:
+        CompactModel.from_mlp(model).save(path, quantize=quantize)
+        return CompactModel.load(path), os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def benchmark_inference(model, x_val, export_format="compact", quantize=True,
+                        repeats=20, calls=100):
+    """
+    Measures the inference cost of a model on the validation set, through the
+    InferenceEngine the classification system runs on the exported model:
+    latency of a single prepared session, batched latency per row, size of the
+    deployed file, and multiply-adds of a forward pass (a cost that does not depend
+    on the load of the machine). Each of `repeats` rows is classified `calls` times; every row costs
+    the same, so the fastest run is kept, as the least disturbed by other processes
+    """
+    deployed, size = exported_model(model, export_format, quantize)
+    engine = InferenceEngine(deployed)
+    records = x_val.to_dict("records")
+    single_row_times = []
+    for record in records[:repeats]:
+        start = time.perf_counter()
+        for _ in range(calls):
+            engine.predict_session(record)
+        single_row_times.append((time.perf_counter() - start) / calls)
+    start = time.perf_counter()
+    engine.predict_sessions(records)
+    batch_time = time.perf_counter() - start
+    return {
+        "single_row_latency_ms": min(single_row_times) * 1e3,
+        "batch_latency_us_per_row": batch_time / max(len(records), 1) * 1e6,
+        "model_size_kb": size / 1024,
+        "multiply_adds": int(sum(w.size for w in engine.weights))
+    }
+
+
+def fit_auto_candidate(layers, neurons, max_iterations, tolerance, n_iter_no_change,
+                       x_train, y_train, x_val, y_val):
+    """
+    Trains an MLP classifier one epoch at a time, tracking the validation loss, and
+    returns it as it was at the selected epoch: the last one improving the best
+    validation loss by more than `tolerance` (relative), which is the knee of the curve.
+    Only the weights of that epoch are kept, and training stops after
+    `n_iter_no_change` epochs without such an improvement.
+    The validation loss curve of the trained epochs is kept in `validation_loss_curve_`
+    """
+    model = MLPClassifier(random_state=42, hidden_layer_sizes=(neurons,) * layers)
+    classes = np.unique(y_train)
+    validation_losses = []
+    best_loss, selected, best_weights = np.inf, 0, None
+    for epoch in range(max_iterations):
+        model.partial_fit(x_train, y_train, classes=classes)
+        loss = validation_loss(model, x_val, y_val)
+        validation_losses.append(loss)
+        if loss < best_loss * (1 - tolerance):
+            best_loss, selected = loss, epoch
+            best_weights = ([w.copy() for w in model.coefs_],
+                            [b.copy() for b in model.intercepts_])
+        elif epoch - selected >= n_iter_no_change:
+            break
+    model.coefs_, model.intercepts_ = best_weights
+    model.loss_curve_ = model.loss_curve_[:selected + 1]
+    model.n_iter_ = selected + 1
+    model.validation_loss_curve_ = validation_losses
+    return model, 1 - model.score(x_train, y_train)
+
 
 class NeuralNetwork:
     """
     Implementation of the Neural Network class to handle training
-    validation and testing of the neural network: building models
+    validation and testing of the neural network: building models.
+    Labels are encoded with a LabelEncoder fitted on every attack risk level,
+    persisted with each model as `label_encoder_`
     """
-    def __init__(self, hidden_layer_size_range, hidden_neuron_per_layer_range):
+    # Shared by every instance, it survives the resets of __init__
+    dataset_cache = DatasetCache()
+    label_encoder = LabelEncoder().fit(LABEL_NAMES)
+
+    def __init__(self, hidden_layer_size_range, hidden_neuron_per_layer_range,
+                 max_resident_models=5, memory_limit_mb=256, training_cache=None,
+                 store_dir=CandidateStore.STORE_DIR):
         self.number_iterations = 0  # default value
         self.hidden_layer_size_range = hidden_layer_size_range  # default value
         self.hidden_neuron_per_layer_range = hidden_neuron_per_layer_range  # default value
@@ -20,8 +167,12 @@ class NeuralNetwork:
         self.hidden_neuron_per_layer = 100  # default value
         self.current_layer = None
         self.current_neuron_per_layer = None
-        self.models = []
+        # Trained models are spilled to disk, only the best ones stay in memory
+        self.models = CandidateStore(max_resident_models, memory_limit_mb, store_dir)
         self.models_info = []
+        self.model_keys = []  # id -> training cache key
+        self.training_cache = training_cache
+        self.train_hash = None
         self.x_train, self.x_val, self.x_test = None, None, None
         self.y_train, self.y_val, self.y_test = None, None, None
 
@@ -33,11 +184,33 @@ class NeuralNetwork:
         """
         print(f"[NeuralNetwork] Load data from {csv}")
         df = pd.read_csv(csv)
-        le = LabelEncoder()
-        df["label"] = le.fit_transform(df["label"])
+        df["label"] = NeuralNetwork.label_encoder.transform(df["label"])
         print("[NeuralNetwork] Data loaded correctly and labeled encoded.")
         return df.drop(columns=["label", "uuid"]), df["label"]
 
+    @staticmethod
+    def load_data_from_npz(npz):
+        """
+        Loads data from a binary calibration set file
+        Features are memory mapped, labels are already integer encoded
+        """
+        print(f"[NeuralNetwork] Load data from {npz}")
+        calibration_set = load_calibration_set(npz)
+        x = pd.DataFrame(calibration_set.features, columns=calibration_set.feature_names,
+                         copy=False)
+        y = pd.Series(calibration_set.labels, name="label")
+        print("[NeuralNetwork] Data loaded correctly (memory mapped).")
+        return x, y
+
+    @staticmethod
+    def load_data(path):
+        """
+        Loads data from a calibration set, either a CSV or a binary NPZ file
+        """
+        if path.endswith(".npz"):
+            return NeuralNetwork.load_data_from_npz(path)
+        return NeuralNetwork.load_data_from_csv(path)
+
     def set_avg_hyper_params(self):
         """
         Sets average hyperparameters for neural network:
@@ -92,6 +265,15 @@ class NeuralNetwork:
         # End of Grid Search
         return False
 
+    def hyper_params_grid(self):
+        """
+        Enumerates every (layers, neurons) point of the grid search
+        """
+        grid = []
+        while self.set_hyper_params():
+            grid.append((self.hidden_layer_size, self.hidden_neuron_per_layer))
+        return grid
+
     def _apply_params(self):
         """
         Applies hyperparameters for neural network:
@@ -102,47 +284,203 @@ class NeuralNetwork:
         print(f"[NeuralNetwork] New HyperParams: Layers={self.current_layer}, "
               f"Neurons={self.current_neuron_per_layer}")
 
-    def calibrate(self, path):
+    def calibrate(self, path, warm_start=False):
         """
         Calibrates neural network:
-        trains an MLP classifier and saves the trained model
-        """
-        print(f"[NeuralNetwork] Training ({self.number_iterations} iterations)...")
-        layers = (self.hidden_neuron_per_layer,) * self.hidden_layer_size
-        model = MLPClassifier(
-                              max_iter=self.number_iterations,
-                              random_state=42,
-                              hidden_layer_sizes=layers,
-                              early_stopping=False,
-                              tol=0.0,  # prevents early stop due to tolerance threshold
-                              n_iter_no_change=self.number_iterations
-                              )
-        self.x_train, self.y_train = self.load_data_from_csv(path)
-        model.fit(self.x_train, self.y_train)
+        trains an MLP classifier and saves the trained model.
+        With warm start, the longest trained previous model of the same network
+        with fewer iterations is continued instead of training from scratch
+        """
+        self._load_train_set(path)
+        # Looked up in the models info, so that the stored models are not loaded
+        previous_info = max(
+            (info for info in self.models_info
+             if info["hidden_layer_size"] == self.hidden_layer_size
+             and info["hidden_neuron_per_layer"] == self.hidden_neuron_per_layer
+             and info["iterations"] < self.number_iterations),
+            key=lambda info: info["iterations"],
+            default=None
+        )
+        if warm_start and previous_info is not None:
+            print(f"[NeuralNetwork] Training ({self.number_iterations} iterations, "
+                  f"continuing from {previous_info['iterations']})...")
+            task = self._continue_task(previous_info["id"], self.number_iterations)
+        else:
+            print(f"[NeuralNetwork] Training ({self.number_iterations} iterations)...")
+            task = self._fit_task(self.hidden_layer_size, self.hidden_neuron_per_layer,
+                                  self.number_iterations)
+        result = self._train([task], n_jobs=1)[0]
+        self._add_model(result, self.hidden_layer_size, self.hidden_neuron_per_layer)
+        return result[0].loss_curve_
+
+    def calibrate_auto(self, train_path, validation_path, max_iterations, tolerance=0.01,
+                       n_iter_no_change=10):
+        """
+        Calibrates neural network selecting the number of iterations automatically:
+        trains once for up to `max_iterations` epochs tracking the validation loss,
+        keeps the model at the knee of the curve and sets the number of iterations to it.
+        Returns the training and validation loss curves (the latter covers every trained
+        epoch)
+        """
+        self._load_train_set(train_path)
+        x_val, y_val = self.dataset_cache.get(validation_path, self.load_data)
+        print(f"[NeuralNetwork] Training (up to {max_iterations} iterations, "
+              f"automatic selection)...")
+        validation_hash = (self.training_cache.dataset_hash(validation_path)
+                           if self.training_cache is not None else None)
+        key = TrainingCache.key(["auto", max_iterations, tolerance, n_iter_no_change],
+                                f"{self.train_hash}:{validation_hash}",
+                                self.hidden_layer_size, self.hidden_neuron_per_layer)
+        task = (key, fit_auto_candidate,
+                (self.hidden_layer_size, self.hidden_neuron_per_layer, max_iterations,
+                 tolerance, n_iter_no_change, self.x_train, self.y_train, x_val, y_val))
+        result = self._train([task], n_jobs=1)[0]
+        model = result[0]
+        self.set_number_iterations(model.n_iter_)
+        print(f"[NeuralNetwork] Selected {model.n_iter_} iterations "
+              f"(validation loss {model.validation_loss_curve_[model.n_iter_ - 1]:.4f})")
+        self._add_model(result, self.hidden_layer_size, self.hidden_neuron_per_layer)
+        return model.loss_curve_, model.validation_loss_curve_
+
+    def calibrate_grid(self, path, grid, n_jobs=-1):
+        """
+        Calibrates neural network for every (layers, neurons) point of the grid:
+        the models are trained in parallel worker processes and added in grid order
+        """
+        print(f"[NeuralNetwork] Training {len(grid)} models "
+              f"({self.number_iterations} iterations, {n_jobs} jobs)...")
+        self._load_train_set(path)
+        results = self._train(
+            [self._fit_task(layers, neurons, self.number_iterations) for layers, neurons in grid],
+            n_jobs
+        )
+        for (layers, neurons), result in zip(grid, results):
+            self._add_model(result, layers, neurons)
+
+    def calibrate_halving(self, train_path, validation_path, grid, n_jobs=-1,
+                          min_iterations=10, factor=3):
+        """
+        Calibrates neural network with successive halving over the grid:
+        every network is trained for `min_iterations` epochs, then only the best
+        1/`factor` by validation log loss is continued for `factor` times more epochs,
+        until the number of iterations is reached. Every network is added, as trained
+        when it was discarded
+        """
+        self._load_train_set(train_path)
+        x_val, y_val = self.dataset_cache.get(validation_path, self.load_data)
+        budget = min(min_iterations, self.number_iterations)
+        print(f"[NeuralNetwork] Successive halving of {len(grid)} models "
+              f"({budget} to {self.number_iterations} iterations, {n_jobs} jobs)...")
+        results = self._train(
+            [self._fit_task(layers, neurons, budget) for layers, neurons in grid], n_jobs
+        )
+        alive = list(range(len(grid)))
+        while True:
+            losses = {i: validation_loss(results[i][0], x_val, y_val) for i in alive}
+            print(f"[NeuralNetwork] {len(alive)} models at {budget} iterations, "
+                  f"best validation loss {min(losses.values()):.4f}")
+            if budget >= self.number_iterations:
+                break
+            keep = max(1, math.ceil(len(alive) / factor))
+            alive = sorted(alive, key=losses.get)[:keep]
+            # The last survivor gets the full budget
+            budget = (self.number_iterations if keep == 1
+                      else min(budget * factor, self.number_iterations))
+            continued = self._train(
+                [self._continue_task(results[i], budget) for i in alive], n_jobs
+            )
+            for i, result in zip(alive, continued):
+                results[i] = result
+        for (layers, neurons), result in zip(grid, results):
+            self._add_model(result, layers, neurons)
+
+    def _load_train_set(self, path):
+        """
+        Loads the training set and the content hash identifying it in the training cache:
+        utility function
+        """
+        self.x_train, self.y_train = self.dataset_cache.get(path, self.load_data)
+        if self.training_cache is not None:
+            self.train_hash = self.training_cache.dataset_hash(path)
+
+    def _fit_task(self, layers, neurons, iterations):
+        """
+        Returns the training cache key, the function and its arguments training
+        a network from scratch on the training set
+        """
+        key = TrainingCache.key(iterations, self.train_hash, layers, neurons)
+        return key, fit_candidate, (layers, neurons, iterations, self.x_train, self.y_train)
+
+    def _continue_task(self, previous, iterations):
+        """
+        Returns the training cache key, the function and its arguments continuing a
+        model, given either as a stored model id or as a training result
+        """
+        if isinstance(previous, int):
+            model, key = self.models[previous], self.model_keys[previous]
+        else:
+            model, _, key, _ = previous
+        return (TrainingCache.key(iterations, parent_key=key), continue_candidate,
+                (model, iterations, self.x_train, self.y_train))
+
+    def _train(self, tasks, n_jobs):
+        """
+        Runs (key, function, arguments) training tasks, in worker processes,
+        except for the ones whose result is in the training cache.
+        Returns their (model, training error, key, cache hit) in order
+        """
+        cached = [self.training_cache.get(key) if self.training_cache is not None else None
+                  for key, _, _ in tasks]
+        missing = [i for i, result in enumerate(cached) if result is None]
+        if missing:
+            # One BLAS thread per worker, the parallelism comes from the workers
+            with parallel_config(backend="loky", inner_max_num_threads=1):
+                trained = Parallel(n_jobs=n_jobs)(
+                    delayed(tasks[i][1])(*tasks[i][2]) for i in missing
+                )
+            for i, (model, training_error) in zip(missing, trained):
+                cached[i] = (model, training_error)
+                if self.training_cache is not None:
+                    self.training_cache.put(tasks[i][0], model, training_error)
+        return [(model, training_error, key, i not in missing)
+                for i, ((model, training_error), (key, _, _)) in enumerate(zip(cached, tasks))]
+
+    def _add_model(self, result, layers, neurons):
+        """
+        Adds a (model, training error, key, cache hit) training result and its info:
+        utility function
+        """
+        model, training_error, key, cache_hit = result
+        model.label_encoder_ = self.label_encoder
         self.models.append(model)
-        network_complexity = self.hidden_neuron_per_layer * self.hidden_layer_size
+        self.model_keys.append(key)
         self.models_info.append(
                                 {
                                     "id": len(self.models) - 1,
                                     "validation_error": None,
-                                    "training_error": 1 - model.score(self.x_train, self.y_train),
+                                    "training_error": training_error,
                                     "difference": None,
-                                    "hidden_neuron_per_layer": self.hidden_neuron_per_layer,
-                                    "hidden_layer_size": self.hidden_layer_size,
-                                    "network_complexity": network_complexity
+                                    "hidden_neuron_per_layer": neurons,
+                                    "hidden_layer_size": layers,
+                                    "network_complexity": neurons * layers,
+                                    "iterations": model.n_iter_,
+                                    "cache_hit": cache_hit
                                 }
         )
-        return model.loss_curve_
 
-    def validate(self, path):
+    def validate(self, path, export_format="compact", quantize=True):
         """
         Validates neural network:
-        validates all trained models against the validation set
+        validates all trained models against the validation set, and benchmarks
+        their inference in the given export format
         """
-        self.x_val, self.y_val = self.load_data_from_csv(path)
+        self.x_val, self.y_val = self.dataset_cache.get(path, self.load_data)
         for c_id, model in enumerate(self.models):
             self.models_info[c_id]["validation_error"] = 1 - model.score(self.x_val, self.y_val)
             val_err = self.models_info[c_id]["validation_error"]
+            self.models.set_score(c_id, val_err)
+            self.models_info[c_id].update(
+                benchmark_inference(model, self.x_val, export_format, quantize))
             train_err = self.models_info[c_id]["training_error"]
             if val_err is None or val_err == 0:
                 print(f"[NeuralNetwork] Validation error: {val_err} critical error")
@@ -160,6 +498,6 @@ class NeuralNetwork:
         Tests neural network:
         tests valid classifier against the test set
         """
-        self.x_test, self.y_test = self.load_data_from_csv(path)
+        self.x_test, self.y_test = self.dataset_cache.get(path, self.load_data)
         model = self.models[classifier_id]
         return 1 - model.score(self.x_test, self.y_test), self.models_info[classifier_id]
@@ -0,0 +1,98 @@
+"""
+Compares the exhaustive grid search with successive halving: wall time and best
+validation error over the grid of the development system configuration.
+
+Usage (from the repository root):
+
+    python -m development_system.search_benchmark --sessions 20000 --iterations 100
+
+The calibration sets are synthetic, with as many features as the prepared sessions
+and a label that depends non-linearly on them.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.datasets import make_classification
+
+from development_system.development_system_controller import DevelopmentSystemController
+from development_system.neural_network import NeuralNetwork
+from shared.calibration_set import LABEL_NAMES, save_calibration_set
+from shared.loader import load_and_validate_json_file
+
+
+def generate_calibration_sets(n_sessions: int, work_dir: str, seed: int = 42) -> tuple[str, str]:
+    """
+    Writes a synthetic train and validation set, returns their paths
+    """
+    x, y = make_classification(n_samples=n_sessions, n_features=6, n_informative=4,
+                               n_redundant=0, n_classes=len(LABEL_NAMES),
+                               n_clusters_per_class=2, random_state=seed)
+    df = pd.DataFrame(x, columns=[f"feature_{i}" for i in range(x.shape[1])])
+    df.insert(0, "uuid", [f"{i:032x}" for i in range(n_sessions)])
+    df["label"] = np.array(LABEL_NAMES)[y]
+    split = int(n_sessions * 0.8)
+    paths = (os.path.join(work_dir, "train_set.bench.npz"),
+             os.path.join(work_dir, "validation_set.bench.npz"))
+    save_calibration_set(paths[0], df.iloc[:split])
+    save_calibration_set(paths[1], df.iloc[split:])
+    return paths
+
+
+def benchmark(strategy: str, config: dict, iterations: int,
+              train_set: str, validation_set: str) -> dict[str, float]:
+    """
+    Runs one search strategy, returns its wall time and best validation error
+    """
+    network = NeuralNetwork(config["hiddenLayerSizeRange"], config["hiddenNeuronPerLayerRange"])
+    network.set_number_iterations(iterations)
+    grid = network.hyper_params_grid()
+    start = time.perf_counter()
+    if strategy == "successiveHalving":
+        network.calibrate_halving(train_set, validation_set, grid, config["parallelJobs"],
+                                  config["halvingMinIterations"], config["halvingFactor"])
+    else:
+        network.calibrate_grid(train_set, grid, config["parallelJobs"])
+    wall_time = time.perf_counter() - start
+    network.validate(validation_set)
+    best = min(network.models_info, key=lambda info: info["validation_error"])
+    return {
+        "models": len(grid),
+        "epochs": sum(info["iterations"] for info in network.models_info),
+        "wall_s": wall_time,
+        "best_validation_error": best["validation_error"]
+    }
+
+
+def main() -> None:
+    """
+    Entry point of the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Hyperparameter search benchmark")
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    config = load_and_validate_json_file(DevelopmentSystemController.CONFIG_PATH,
+                                         DevelopmentSystemController.CONFIG_SCHEMA_PATH)
+    with tempfile.TemporaryDirectory() as work_dir:
+        train_set, validation_set = generate_calibration_sets(args.sessions, work_dir)
+        results = {
+            strategy: benchmark(strategy, config, args.iterations, train_set, validation_set)
+            for strategy in ("grid", "successiveHalving")
+        }
+
+    print(f"\n--- SEARCH BENCHMARK ({args.sessions} sessions, {args.iterations} iterations) ---")
+    print(f"{'strategy':<20}{'models':>8}{'epochs':>8}{'wall s':>10}{'best val error':>16}")
+    for strategy, r in results.items():
+        print(f"{strategy:<20}{r['models']:>8}{r['epochs']:>8}{r['wall_s']:>10.1f}"
+              f"{r['best_validation_error']:>16.4f}")
+    print("-----------------------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import json
 import os
 from joblib import dump
 from development_system.test_view import TestView
+from shared.compact_model import CompactModel
 from shared.systemsio import SystemsIO
 
 
@@ -13,10 +14,11 @@ class TestController:
     Handles all test operations.
     """
 
-    CLASSIFIER_PATH = "development_system/classifier/classifier.joblib"
+    CLASSIFIER_DIR = "development_system/classifier"
 
-    def __init__(self, parent):
+    def __init__(self, parent, config_path):
         self.parent = parent
+        self.config_path = config_path
         self.view = TestView()
 
     def run(self, test_set):
@@ -37,17 +39,17 @@ class TestController:
         if test_passed:
             # Create and Send Classifier
             model = self.parent.neural_network.models[self.parent.valid_classifier_id]
-            os.makedirs("development_system/classifier", exist_ok=True)
-            customer = test_set.split(".")[1]
-            dump(model, f"development_system/classifier/classifier.{customer}.joblib")
+            os.makedirs(self.CLASSIFIER_DIR, exist_ok=True)
+            classifier_path = self.export(model,
+                                          f"{self.CLASSIFIER_DIR}/classifier.{self.parent.source}")
             address = self.parent.classification_address
-            SystemsIO.send_files(address, "/classifier", [self.CLASSIFIER_PATH])
+            SystemsIO.send_files(address, "/classifier", [classifier_path])
             print("[Test] Classifier sent")
         else:
             # Reconfigure hyper params ranges
             print(f"[Test] New range hidden layers size: {hidden_layer_size}")
             print(f"[Test] New range neurons per hidden layer: {hidden_neuron_per_layer}")
-            path = self.parent.CONFIG_PATH
+            path = self.config_path
             with open(path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             data["hiddenNeuronPerLayerRange"] = hidden_layer_size
@@ -55,3 +57,32 @@ class TestController:
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2)
         return test_passed
+
+    def export(self, model, path_prefix):
+        """
+        Exports the classifier and returns its path: as a compact model (float32 or
+        int8 weights) if configured and if its accuracy on the test set drifts from
+        the original model by at most the configured tolerance, as a pickle otherwise
+        """
+        export_cfg = self.parent.config["classifierExport"]
+        if export_cfg["format"] == "compact":
+            x_test = self.parent.neural_network.x_test
+            y_test = self.parent.neural_network.y_test
+            accuracy = model.score(x_test, y_test)
+            expected = model.label_encoder_.inverse_transform(y_test)
+            compact = CompactModel.from_mlp(model)
+            path = f"{path_prefix}.npz"
+            # Quantized weights are tried first, then float32 ones
+            for quantize in ([True, False] if export_cfg["quantize"] else [False]):
+                compact.save(path, quantize=quantize)
+                exported = CompactModel.load(path)
+                drift = abs((exported.predict(x_test) == expected).mean() - accuracy)
+                print(f"[Test] Compact export ({'int8' if quantize else 'float32'}): "
+                      f"accuracy drift {drift:.4f}, {os.path.getsize(path) / 1024:.1f} KB")
+                if drift <= export_cfg["maxAccuracyDrift"]:
+                    return path
+            os.remove(path)
+            print("[Test] Compact export drifts too much, exporting the pickled model")
+        path = f"{path_prefix}.joblib"
+        dump(model, path)
+        return path
@@ -0,0 +1,123 @@
+"""
+This file contains the implementation of the TrainingCache class
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+from joblib import dump, load
+import sklearn
+
+
+class TrainingCache:
+    """
+    Persistent cache of the training results. Since training is deterministic
+    (fixed random state), a model is identified by the content of its training set,
+    its hyperparameters, its iterations and the sklearn version; a model continued
+    from another one (warm start) is identified by the key of that model and its
+    iterations. Cached models are returned with their loss curve and training error
+    without calling `fit`. The least recently used entries are deleted beyond
+    `max_entries`.
+    A single cache is shared by the concurrent development jobs: the dataset hashes,
+    the counters and the eviction are guarded by a lock, and entries deleted meanwhile
+    (by another job or process) are treated as missing
+    """
+    CACHE_DIR = "development_system/training_cache"
+
+    def __init__(self, max_entries=1000, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.dataset_hashes = {}  # (path, mtime, size) -> content hash
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def dataset_hash(self, path):
+        """
+        Returns the SHA-256 of the content of a calibration set file
+        """
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if file_key in self.dataset_hashes:
+                return self.dataset_hashes[file_key]
+        # Hashed outside the lock, two jobs hashing the same file compute the same digest
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+        with self._lock:
+            self.dataset_hashes[file_key] = digest.hexdigest()
+        return self.dataset_hashes[file_key]
+
+    @staticmethod
+    def key(iterations, dataset_hash=None, layers=None, neurons=None, parent_key=None):
+        """
+        Returns the key of a model trained from scratch on a dataset,
+        or continued from the model with `parent_key`
+        """
+        params = {
+            "sklearn": sklearn.__version__,
+            "iterations": iterations,
+            "dataset": dataset_hash,
+            "layers": layers,
+            "neurons": neurons,
+            "parent": parent_key
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def get(self, key):
+        """
+        Returns the cached (model, training error) of a key, or None.
+        An entry that cannot be loaded (e.g. truncated) is deleted and counts as a miss
+        """
+        path = self._path(key)
+        try:
+            entry = load(path)
+            os.utime(path)  # Marks the entry as recently used
+        except FileNotFoundError:
+            # Evicted by another job, possibly right after being loaded
+            entry = None
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            print(f"[TrainingCache] Deleting unreadable entry {path}: {e}")
+            Path(path).unlink(missing_ok=True)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key, model, training_error):
+        """
+        Stores a training result, evicting the least recently used entries.
+        The entry is written to a temporary file and renamed, so it is never seen partially
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                dump((model, training_error), f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".joblib"):
+                    try:
+                        entries.append((entry.stat().st_mtime_ns, entry.path))
+                    except FileNotFoundError:
+                        continue
+            entries.sort()
+            for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+                Path(path).unlink(missing_ok=True)
@@ -15,7 +15,7 @@ class TrainingController:
 
     def __init__(self, parent):
         self.parent = parent
-        self.view = CalibrationView()
+        self.view = CalibrationView(f"calibration_plot.{parent.source}")
 
     def set_average_params(self):
         """
@@ -23,7 +23,7 @@ class TrainingController:
         """
         self.parent.neural_network.set_avg_hyper_params()
 
-    def run(self, test_set):
+    def run(self, test_set, validation_set):
         """
         Runs the training phase.
         """
@@ -31,6 +31,16 @@ class TrainingController:
         # Set average hyper params
         if iterations is None or iterations == 0:
             self.set_average_params()
+        selection = self.parent.config["iterationSelection"]
+        if selection["automatic"]:
+            # A single training run, the number of iterations is read from the
+            # validation loss curve instead of being retried until fine
+            loss_curve, validation_loss_curve = self.parent.neural_network.calibrate_auto(
+                test_set, validation_set, selection["maxIterations"], selection["lossTolerance"],
+                selection["noImprovementIterations"])
+            self.view.build_report(loss_curve, validation_loss_curve)
+            self.parent.iterations_fine = True
+            return
         # Read number of iterations
         if not self.parent.service_flag:
             iterations = input(">> Insert number of iterations (eg. 100): ")
@@ -38,7 +48,8 @@ class TrainingController:
             iterations = 100 + randint(-50, 50)
         self.parent.neural_network.set_number_iterations(iterations)
         # Calibrate
-        loss_curve = self.parent.neural_network.calibrate(test_set)
+        loss_curve = self.parent.neural_network.calibrate(test_set,
+                                                          self.parent.config["warmStart"])
         # Build Report
         self.view.build_report(loss_curve)
         # Read User Input (iterations decision)
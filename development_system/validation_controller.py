@@ -19,17 +19,25 @@ class ValidationController:
         runs the validation phase.
         """
         # Set HyperParams
-        self.ongoing_validation = self.parent.neural_network.set_hyper_params()
-        print("[Validation] Initial HyperParams set (Grid Search).")
+        grid = self.parent.neural_network.hyper_params_grid()
+        print(f"[Validation] {len(grid)} HyperParams set (Grid Search).")
 
-        while self.ongoing_validation:
-            # Calibrate
-            self.parent.neural_network.calibrate(test_set)
-            # Set HyperParams
-            self.ongoing_validation = self.parent.neural_network.set_hyper_params()
+        # Calibrate
+        self.ongoing_validation = True
+        config = self.parent.config
+        if config["searchStrategy"] == "successiveHalving":
+            self.parent.neural_network.calibrate_halving(test_set, validation_set, grid,
+                                                         self.parent.n_jobs,
+                                                         config["halvingMinIterations"],
+                                                         config["halvingFactor"])
+        else:
+            self.parent.neural_network.calibrate_grid(test_set, grid, self.parent.n_jobs)
+        self.ongoing_validation = False
 
         # Validation score
-        res = self.parent.neural_network.validate(validation_set)
+        export_cfg = self.parent.config["classifierExport"]
+        res = self.parent.neural_network.validate(validation_set, export_cfg["format"],
+                                                  export_cfg["quantize"])
         if not res:
             print("[Validation] Validation failed.")
             return
@@ -38,7 +46,8 @@ class ValidationController:
 
         # Read User Input (Classifier decision)
         overfitting_tolerance = self.parent.config["overfittingTolerance"]
-        res = self.view.read_user_input(self.parent.service_flag, top_five, overfitting_tolerance)
+        res = self.view.read_user_input(self.parent.service_flag, top_five, overfitting_tolerance,
+                                        self.parent.config["latencyErrorTolerance"])
         print(f"[Validation] Valid classifier selected: {res}")
         if res != "n" and 0 <= int(res) <= len(self.parent.neural_network.models):
             self.parent.valid_classifier_id = int(res)
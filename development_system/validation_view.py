@@ -18,13 +18,17 @@ class ValidationView:
         print("\n--- VALIDATION REPORT ---")
         for model in top_five:
             print(model)
+        cache_hits = sum(1 for model in models_info if model.get("cache_hit"))
+        print(f"Training cache hits: {cache_hits}/{len(models_info)} models")
         print("-------------------------")
         return top_five
 
     @staticmethod
-    def read_user_input(flag, top_five, overfitting_tolerance):
+    def read_user_input(flag, top_five, overfitting_tolerance, latency_error_tolerance=0.0):
         """
         Reads the user input for the validation results.
+        With a latency error tolerance, the automated decision picks the candidate with
+        the lowest single-row latency among those within that validation error of the best.
         """
         # Data Scientist: Valid classifier decision
         if not flag:
@@ -33,6 +37,19 @@ class ValidationView:
         second_best = top_five[1]
         if random() < 0.05 or best["difference"] > overfitting_tolerance:
             return "n"
+        if latency_error_tolerance > 0:
+            eligible = [
+                model for model in top_five
+                if model["validation_error"] - best["validation_error"] <= latency_error_tolerance
+                and model["difference"] <= overfitting_tolerance
+            ]
+            fastest = min(eligible, key=lambda x: x["single_row_latency_ms"])
+            # Latencies are noisy, the best model is only traded for a clear speedup
+            # of a model that also computes less
+            if (fastest["single_row_latency_ms"] < 0.9 * best["single_row_latency_ms"]
+                    and fastest["multiply_adds"] < best["multiply_adds"]):
+                return fastest["id"]
+            return best["id"]
         val_err_diff = best["validation_error"] - second_best["validation_error"]
         if val_err_diff >= 0.05 or second_best["difference"] > overfitting_tolerance:
             return best["id"]
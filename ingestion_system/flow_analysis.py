@@ -15,15 +15,18 @@ class FlowAnalysis:
     TARGET_SEQUENCE_LENGTH = 10
 
     @staticmethod
-    def mark_missing_samples(session: RawSession, missing_samples_threshold: float) -> bool:
+    def mark_missing_samples(
+            session: RawSession,
+            missing_samples_threshold: float,
+            target_length: int = TARGET_SEQUENCE_LENGTH
+    ) -> bool:
         """
         Calculates the TOTAL missing samples across all columns.
-        If the total is within the threshold, pads columns to the target length (10).
+        If the total is within the threshold, pads columns to the target length
+        (10 unless configured otherwise).
         Returns True if the session was valid and padded, False otherwise.
         """
 
-        target_length = FlowAnalysis.TARGET_SEQUENCE_LENGTH
-
         columns_data = [
             session.timestamp,
             session.amount,
@@ -88,7 +88,8 @@ class IngestionSystemController:
 
             if not self.analysis.mark_missing_samples(
                     raw_session,
-                    self.local_config["missingSamplesThreshold"]
+                    self.local_config["missingSamplesThreshold"],
+                    self.local_config["targetSequenceLength"]
             ):
                 return
 
@@ -0,0 +1,227 @@
+"""
+Offline bulk backfill of the preparation system.
+
+Reads raw sessions from an NDJSON, CSV or Parquet file in streaming chunks, corrects
+them and extracts their features in parallel batches, then writes the prepared sessions
+straight into the segregation PreparedSessionsDB or into a columnar (CSV/Parquet) file,
+bypassing the HTTP pipeline. Usage (from the repository root):
+
+    python -m preparation_system.backfill raw_sessions.ndjson \
+        --output segregation_system/prepared_sessions.db --jobs 8
+
+CSV inputs store every list column as a JSON array. Parquet input and output require
+the optional ``pyarrow`` package.
+"""
+
+import argparse
+from collections.abc import Iterator
+import json
+import os
+import time
+from typing import Any
+
+import pandas as pd
+from joblib import Parallel, delayed
+
+from ingestion_system.raw_session import RawSession
+from shared.loader import load_and_validate_json_file
+from preparation_system.data_corrector import DataCorrector
+from preparation_system.feature_extractor import FeatureExtractor
+from preparation_system.preparation_system_controller import PreparationSystemController
+from segregation_system.segregation_system_controller import SegregationSystemController
+from segregation_system.prepared_sessions_db import PreparedSessionsDB, PreparedSession
+
+LIST_COLUMNS = ("timestamp", "amount", "source_ip", "dest_ip", "longitude", "latitude")
+
+
+def _read_ndjson(path: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    chunk = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _read_csv(path: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    for df in pd.read_csv(path, chunksize=chunk_size, dtype={"uuid": str, "label": str}):
+        records = df.to_dict(orient="records")
+        for record in records:
+            for column in LIST_COLUMNS:
+                record[column] = json.loads(record[column])
+            if pd.isna(record.get("label")):
+                record["label"] = None
+        yield records
+
+
+def _read_parquet(path: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    try:
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise SystemExit("[Backfill] Parquet support requires the 'pyarrow' package") from e
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+def read_raw_sessions(path: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """
+    Streams the raw sessions of a file in chunks of at most `chunk_size` records
+    """
+    extension = os.path.splitext(path)[1].lower()
+    readers = {
+        ".ndjson": _read_ndjson,
+        ".jsonl": _read_ndjson,
+        ".csv": _read_csv,
+        ".parquet": _read_parquet
+    }
+    if extension not in readers:
+        raise SystemExit(f"[Backfill] Unsupported input format '{extension}'")
+    return readers[extension](path, chunk_size)
+
+
+def prepare_chunk(
+    records: list[dict[str, Any]],
+    corrector: DataCorrector,
+    extractor: FeatureExtractor
+) -> list[dict[str, Any]]:
+    """
+    Corrects a chunk of raw sessions and extracts their features.
+    Invalid records are skipped
+    """
+    prepared = []
+    for record in records:
+        try:
+            session = RawSession(**record)
+        except TypeError as e:
+            print(f"[Backfill] Invalid RawSession skipped: {e}")
+            continue
+        session = corrector.correct_missing_samples(session)
+        session = corrector.correct_absolute_outiers(session)
+        prepared.append(extractor.extract_features(session))
+    return prepared
+
+
+class PreparedSessionsWriter:
+    """
+    Writes chunks of prepared sessions to the segregation database (`.db`) or to a
+    columnar file (`.csv`, `.parquet`)
+
+    :ivar path: The output path, its extension selects the output format
+    :type path: str
+    :ivar written: Number of prepared sessions written so far
+    :type written: int
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._format = os.path.splitext(path)[1].lower()
+        self._db = None
+        self._parquet_writer = None
+        if self._format == ".db":
+            segregation_config = load_and_validate_json_file(
+                SegregationSystemController.CONFIG_PATH,
+                SegregationSystemController.CONFIG_SCHEMA_PATH
+            )
+            # The backfill can be re-run from scratch, durability is traded for throughput.
+            # The statistics triggers belong to the segregation system and are left as they
+            # are; the sessions still enter the same per-label reservoirs
+            self._db = PreparedSessionsDB(
+                path,
+                synchronous="OFF",
+                reservoir_size=segregation_config["reservoirMaxSessionsPerLabel"] or None,
+                manage_statistics=False
+            )
+        elif self._format not in (".csv", ".parquet"):
+            raise SystemExit(f"[Backfill] Unsupported output format '{self._format}'")
+
+    def write(self, prepared: list[dict[str, Any]]) -> None:
+        """
+        Appends a chunk of prepared sessions to the output
+        """
+        if not prepared:
+            return
+        if self._db is not None:
+            # The segregation system only stores labelled sessions
+            sessions = [PreparedSession(**p) for p in prepared if p.get("label") is not None]
+            self._db.store_many(sessions)
+            self.written += len(sessions)
+            return
+
+        df = pd.DataFrame(prepared)
+        if self._format == ".csv":
+            df.to_csv(self.path, mode="a", header=self.written == 0, index=False)
+        else:
+            self._write_parquet(df)
+        self.written += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        try:
+            import pyarrow as pa  # pylint: disable=import-outside-toplevel
+            import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise SystemExit("[Backfill] Parquet support requires the 'pyarrow' package") from e
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+
+    def close(self) -> None:
+        """
+        Flushes and closes the output
+        """
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._db is not None:
+            self._db.conn.close()
+
+
+def main() -> None:
+    """
+    Entry point of the backfill command line interface
+    """
+    parser = argparse.ArgumentParser(description="Offline bulk backfill of prepared sessions")
+    parser.add_argument("input", help="Raw sessions file (.ndjson, .jsonl, .csv or .parquet)")
+    parser.add_argument("--output", default="segregation_system/prepared_sessions.db",
+                        help="Output file (.db, .csv or .parquet)")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="Number of raw sessions per parallel batch")
+    parser.add_argument("--jobs", type=int, default=-1,
+                        help="Number of worker processes (-1 uses every core)")
+    args = parser.parse_args()
+
+    config = load_and_validate_json_file(
+        PreparationSystemController.CONFIG_PATH,
+        PreparationSystemController.CONFIG_SCHEMA_PATH
+    )
+    streaming_cfg = config["streamingFeatures"]
+    corrector = DataCorrector(float(config["maxTransactionsAmount"]))
+    extractor = FeatureExtractor(
+        config["extractedFeatures"],
+        streaming_cfg["exactThreshold"] if streaming_cfg["enabled"] else None
+    )
+
+    writer = PreparedSessionsWriter(args.output)
+    start = time.perf_counter()
+    # The generator output and the bounded pre-dispatch keep only a few chunks in memory
+    results = Parallel(n_jobs=args.jobs, return_as="generator", pre_dispatch="2*n_jobs")(
+        delayed(prepare_chunk)(chunk, corrector, extractor)
+        for chunk in read_raw_sessions(args.input, args.chunk_size)
+    )
+    try:
+        for prepared in results:
+            writer.write(prepared)
+            print(f"[Backfill] Written {writer.written} prepared sessions")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"[Backfill] Done: {writer.written} prepared sessions written to '{args.output}' "
+          f"in {elapsed:.1f}s ({writer.written / max(elapsed, 1e-9):.0f} sessions/s)")
+
+
+if __name__ == "__main__":
+    main()
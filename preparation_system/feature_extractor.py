@@ -2,6 +2,7 @@ from statistics import median
 from typing import Dict, Any
 
 from ingestion_system.raw_session import RawSession
+from preparation_system import streaming_statistics
 
 
 class FeatureExtractor:
@@ -10,15 +11,27 @@ class FeatureExtractor:
     Assumes that:
     - all numeric sequences have no None values (handled in DataCorrector),
     - absolute outliers on amounts have already been clipped.
+
+    When ``exact_threshold`` is set, the extractor works in streaming mode: medians and
+    MADs use an O(n) exact selection up to that many samples and a bounded-memory P²
+    estimate beyond it, except for monotone sequences such as the timestamps, which are
+    reduced exactly (see preparation_system/streaming_statistics.py for error bounds).
     """
 
-    def __init__(self, extracted_features: list[str]):
+    def __init__(self, extracted_features: list[str], exact_threshold: int | None = None):
         self.extracted_features = extracted_features
+        self.exact_threshold = exact_threshold
 
-    @staticmethod
-    def _mad(values: list[float]) -> float:
+    def _median(self, values: list[float]) -> float:
+        if self.exact_threshold is None:
+            return median(values)
+        return streaming_statistics.median(values, self.exact_threshold)
+
+    def _mad(self, values: list[float]) -> float:
         if not values:
             return 0.0
+        if self.exact_threshold is not None:
+            return streaming_statistics.mad(values, self.exact_threshold)
         m = median(values)
         deviations = [abs(v - m) for v in values]
         return float(median(deviations))
@@ -62,17 +75,17 @@ class FeatureExtractor:
             result["mad_amounts"] = self._mad(amounts)
 
         if "median_longitude" in self.extracted_features:
-            result["median_longitude"] = float(median(longitudes)) if longitudes else 0.0
+            result["median_longitude"] = float(self._median(longitudes)) if longitudes else 0.0
 
         if "median_latitude" in self.extracted_features:
-            result["median_latitude"] = float(median(latitudes)) if latitudes else 0.0
+            result["median_latitude"] = float(self._median(latitudes)) if latitudes else 0.0
 
         if "median_source_ip" in self.extracted_features:
             ip_ints = [self._ip_to_int(ip) for ip in source_ips]
-            result["median_source_ip"] = int(median(ip_ints)) if ip_ints else 0
+            result["median_source_ip"] = int(self._median(ip_ints)) if ip_ints else 0
 
         if "median_destination_ip" in self.extracted_features:
             ip_ints = [self._ip_to_int(ip) for ip in dest_ips]
-            result["median_destination_ip"] = int(median(ip_ints)) if ip_ints else 0
+            result["median_destination_ip"] = int(self._median(ip_ints)) if ip_ints else 0
 
         return result
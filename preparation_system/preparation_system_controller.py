@@ -6,6 +6,7 @@ from shared.loader import load_and_validate_json_file
 
 from preparation_system.data_corrector import DataCorrector
 from preparation_system.feature_extractor import FeatureExtractor
+from preparation_system.prepared_session_cache import PreparedSessionCache
 
 
 class PreparationSystemController:
@@ -42,7 +43,37 @@ class PreparationSystemController:
         )
 
         self.corrector = DataCorrector(float(self.config["maxTransactionsAmount"]))
-        self.extractor = FeatureExtractor(self.config["extractedFeatures"])
+        streaming_cfg = self.config["streamingFeatures"]
+        self.extractor = FeatureExtractor(
+            self.config["extractedFeatures"],
+            streaming_cfg["exactThreshold"] if streaming_cfg["enabled"] else None
+        )
+
+        dedup_cfg = self.config["deduplication"]
+        self.cache = PreparedSessionCache(
+            dedup_cfg["maxEntries"],
+            dedup_cfg["ttlSeconds"]
+        ) if dedup_cfg["enabled"] else None
+        self.duplicate_policy = dedup_cfg["duplicatePolicy"]
+
+    def _extract_features(self, session: RawSession) -> dict | None:
+        """Extracts the features of a corrected session, reusing the cached ones if the
+        session is a duplicate. Returns None if the duplicate must be suppressed."""
+        if self.cache is None:
+            return self.extractor.extract_features(session)
+
+        key = PreparedSessionCache.key(session)
+        features = self.cache.get(key)
+        if features is None:
+            features = self.extractor.extract_features(session)
+            self.cache.put(key, features)
+            return features
+
+        print(f"[PreparationSystem] Duplicate session {session.uuid} "
+              f"({self.duplicate_policy}), cache {self.cache.stats()}")
+        if self.duplicate_policy == "suppress":
+            return None
+        return features | {"duplicate": True}
 
     def run(self):
         """Runs the main loop of the Preparation System Controller,
@@ -68,7 +99,7 @@ class PreparationSystemController:
             session = self.corrector.correct_missing_samples(session)
             session = self.corrector.correct_absolute_outiers(session)
 
-            features = self.extractor.extract_features(session)
+            features = self._extract_features(session)
             #print(f"[PreparationSystem] Extracted features for {session.uuid}: {features}")
 
             if self.shared_config["systemPhase"]["developmentPhase"]:
@@ -78,10 +109,11 @@ class PreparationSystemController:
                 target = self.classification_address
                 endpoint = "/prepared-session"
 
-            try:
-                SystemsIO.send_json(target, endpoint, features)
-            except requests_exceptions.RequestException as exc:
-                print(f"[PreparationSystem] Failed to send prepared data: {exc}")
+            if features is not None:
+                try:
+                    SystemsIO.send_json(target, endpoint, features)
+                except requests_exceptions.RequestException as exc:
+                    print(f"[PreparationSystem] Failed to send prepared data: {exc}")
 
             if not self.shared_config["serviceFlag"]:
                 break
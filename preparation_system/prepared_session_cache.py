@@ -0,0 +1,73 @@
+"""
+A bounded LRU/TTL cache of extracted features, used to detect retransmitted sessions
+"""
+
+from collections import OrderedDict
+from dataclasses import asdict
+import hashlib
+import json
+import time
+from typing import Any
+
+from ingestion_system.raw_session import RawSession
+
+
+class PreparedSessionCache:
+    """
+    Caches the features extracted from corrected sessions, keyed by uuid and a hash
+    of the corrected session contents, so that duplicated sessions are not prepared twice
+
+    :ivar max_entries: Maximum number of cached sessions, the least recently used one is
+        evicted first
+    :type max_entries: int
+    :ivar ttl_seconds: Number of seconds after which an entry expires
+    :type ttl_seconds: float
+    :ivar hits: Number of lookups that found a cached entry
+    :type hits: int
+    :ivar misses: Number of lookups that did not find a (valid) cached entry
+    :type misses: int
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[float, dict[str, Any]]] = OrderedDict()
+
+    @staticmethod
+    def key(session: RawSession) -> tuple[str, str]:
+        """
+        Builds the cache key of a corrected session
+        """
+        contents = json.dumps(asdict(session), sort_keys=True, separators=(",", ":"))
+        return session.uuid, hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+    def get(self, key: tuple[str, str]) -> dict[str, Any] | None:
+        """
+        Returns the features cached under the given key, or None if there are none
+        or they expired
+        """
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple[str, str], features: dict[str, Any]) -> None:
+        """
+        Caches the features of a session, evicting the least recently used entry if full
+        """
+        self._entries[key] = (time.monotonic(), features)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the hit/miss counters and the current cache size
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,245 @@
+"""
+Bounded-memory median and MAD estimators for long sessions.
+
+Sequences up to a configurable threshold are reduced with an exact O(n) selection
+(introselect through ``numpy.partition``), so results are identical to
+``statistics.median``. Longer sequences are fed one value at a time to a P² estimator
+(Jain & Chlamtac, 1985) that keeps only five markers, whatever the session length.
+
+P² is badly biased on ordered input (on 3000 sorted normal values, the median is off
+by 5% in rank and the MAD by almost 40%), and sessions contain such sequences: the
+timestamps are sorted. Longer sequences that are monotone (non-decreasing or
+non-increasing) are therefore reduced exactly without copying them: the median is
+the middle element, and the MAD is selected from the two sorted runs of deviations
+with a binary search.
+
+Error bounds of the P² estimator, i.e. on non-monotone sequences longer than the
+threshold:
+- the estimate always lies within [min, max] of the observed values, and for
+  ``n <= 5`` it is exact;
+- the P² method gives no worst-case rank guarantee, but on unimodal continuous
+  inputs in random order with ``n >= 1000`` its rank error is empirically below 2%
+  (about 1% on uniform and normal data), i.e. the estimate lies between the true
+  48th and 52nd percentiles;
+- the MAD is computed as the P² median of ``|x - m|`` where ``m`` is the estimated
+  median, so its error compounds the error on ``m`` with the estimator's own error:
+  in the same conditions its relative error stays below 5% (below 2.5% on uniform
+  and normal data);
+- sequences with a strong trend that are not exactly monotone (e.g. sorted values
+  with noise) are not covered by these bounds.
+
+The bounds are checked by tests/test_streaming_statistics.py.
+"""
+
+from collections.abc import Callable, Iterable, Sequence
+from itertools import pairwise
+
+import numpy as np
+
+
+class P2Quantile:
+    """
+    Streaming estimator of a single quantile using the P² algorithm
+
+    :ivar quantile: The quantile being tracked (0, 1)
+    :type quantile: float
+    :ivar count: Number of observations seen so far
+    :type count: int
+    """
+    def __init__(self, quantile: float = 0.5):
+        if not 0 < quantile < 1:
+            raise ValueError(f"Quantile must be in (0, 1), got {quantile}")
+        self.quantile = quantile
+        self.count = 0
+        self._heights: list[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [
+            1.0,
+            1 + 2 * quantile,
+            1 + 4 * quantile,
+            3 + 2 * quantile,
+            5.0
+        ]
+        self._increments = [0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0]
+
+    def add(self, value: float) -> None:
+        """
+        Adds an observation to the estimator in O(1) time and memory
+        """
+        self.count += 1
+        if self.count <= 5:
+            self._heights.append(float(value))
+            if self.count == 5:
+                self._heights.sort()
+            return
+
+        heights = self._heights
+        positions = self._positions
+
+        # Find the cell k such that heights[k] <= value < heights[k + 1]
+        if value < heights[0]:
+            heights[0] = float(value)
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = float(value)
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Adjust the heights of the three middle markers if they drifted
+        for i in range(1, 4):
+            delta = self._desired[i] - positions[i]
+            if ((delta >= 1 and positions[i + 1] - positions[i] > 1) or
+                    (delta <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if delta > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    candidate = self._linear(i, step)
+                heights[i] = candidate
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, step: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+
+    def value(self) -> float:
+        """
+        Returns the current estimate of the quantile
+        """
+        if self.count == 0:
+            return 0.0
+        if self.count <= 5:
+            # Exact quantile over the few values seen so far
+            return float(np.quantile(self._heights, self.quantile))
+        return self._heights[2]
+
+
+def exact_median(values: Sequence[float]) -> float:
+    """
+    Returns the exact median using an O(n) selection instead of a full sort.
+    Even-length inputs return the mean of the two middle values, like ``statistics.median``
+    """
+    n = len(values)
+    if n == 0:
+        return 0.0
+    arr = np.asarray(values, dtype=np.float64)
+    half = n // 2
+    if n % 2:
+        return float(np.partition(arr, half)[half])
+    part = np.partition(arr, (half - 1, half))
+    return float((part[half - 1] + part[half]) / 2)
+
+
+def approximate_median(values: Iterable[float]) -> float:
+    """
+    Returns a P² estimate of the median using constant memory
+    """
+    estimator = P2Quantile(0.5)
+    for v in values:
+        estimator.add(v)
+    return estimator.value()
+
+
+def monotone_direction(values: Sequence[float]) -> int:
+    """
+    Returns 1 if the values are non-decreasing, -1 if they are non-increasing
+    (and not constant), 0 otherwise. Stops at the first pair in each direction
+    that breaks the order, so unordered inputs are rejected early
+    """
+    if all(a <= b for a, b in pairwise(values)):
+        return 1
+    if all(a >= b for a, b in pairwise(values)):
+        return -1
+    return 0
+
+
+def _kth_smallest(first: Callable[[int], float], first_len: int,
+                  second: Callable[[int], float], second_len: int, k: int) -> float:
+    """
+    Returns the k-th (0-based) smallest value of the union of two ascending sequences,
+    given by index accessors, in O(log n) accesses
+    """
+    lo, hi = max(0, k + 1 - second_len), min(k + 1, first_len)
+    # Smallest i such that first[i] >= second[k - i]: the k + 1 smallest values
+    # are then the first i values of `first` and the first k + 1 - i of `second`
+    while lo < hi:
+        i = (lo + hi) // 2
+        if first(i) < second(k - i):
+            lo = i + 1
+        else:
+            hi = i
+    taken = k + 1 - lo
+    return max(first(lo - 1) if lo > 0 else -np.inf,
+               second(taken - 1) if taken > 0 else -np.inf)
+
+
+def _monotone_median_and_mad(values: Sequence[float], direction: int) -> tuple[float, float]:
+    """
+    Returns the exact median and MAD of a monotone sequence without copying it
+    """
+    n = len(values)
+
+    def ascending(i: int) -> float:
+        return float(values[i] if direction > 0 else values[n - 1 - i])
+
+    half = n // 2
+    m = ascending(half) if n % 2 else (ascending(half - 1) + ascending(half)) / 2
+    # The deviations of the lower and the upper half are two ascending runs
+    below = half
+
+    def left(j: int) -> float:
+        return m - ascending(below - 1 - j)
+
+    def right(j: int) -> float:
+        return ascending(below + j) - m
+
+    if n % 2:
+        deviation = _kth_smallest(left, below, right, n - below, half)
+    else:
+        deviation = (_kth_smallest(left, below, right, n - below, half - 1)
+                     + _kth_smallest(left, below, right, n - below, half)) / 2
+    return m, deviation
+
+
+def median(values: Sequence[float], exact_threshold: int) -> float:
+    """
+    Exact median up to ``exact_threshold`` values or for monotone sequences,
+    P² estimate otherwise
+    """
+    if len(values) <= exact_threshold:
+        return exact_median(values)
+    direction = monotone_direction(values)
+    if direction:
+        return _monotone_median_and_mad(values, direction)[0]
+    return approximate_median(values)
+
+
+def mad(values: Sequence[float], exact_threshold: int) -> float:
+    """
+    Median absolute deviation, exact up to ``exact_threshold`` values or for monotone
+    sequences, P² estimate otherwise
+    """
+    if not values:
+        return 0.0
+    if len(values) <= exact_threshold:
+        m = exact_median(values)
+        return exact_median(np.abs(np.asarray(values, dtype=np.float64) - m))
+    direction = monotone_direction(values)
+    if direction:
+        return _monotone_median_and_mad(values, direction)[1]
+    m = approximate_median(values)
+    return approximate_median(abs(v - m) for v in values)
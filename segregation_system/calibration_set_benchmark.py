@@ -0,0 +1,97 @@
+"""
+Benchmarks the CSV and NPZ calibration set formats: write, transfer and load time.
+
+Usage (from the repository root):
+
+    python -m segregation_system.calibration_set_benchmark --sessions 1000000
+
+The transfer is measured as a file copy into another directory. The HTTP upload to
+the development system scales with the file size, which is reported as well.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from development_system.neural_network import NeuralNetwork
+from segregation_system.data_coverage_model import DataCoverageModel
+from shared.attack_risk_level import AttackRiskLevel
+from shared.calibration_set import save_calibration_set
+
+
+def generate_sessions(n_sessions: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Generates a synthetic dataset of prepared sessions with uniformly distributed features
+    """
+    rng = np.random.default_rng(seed)
+    data = {"uuid": [uuid.UUID(int=int(i)).hex for i in rng.integers(0, 2**63, n_sessions)]}
+    for feature, (t_min, t_max) in DataCoverageModel.FEATURE_BOUNDS.items():
+        data[feature.value] = rng.uniform(t_min, t_max, n_sessions)
+    data["label"] = rng.choice([level.value for level in AttackRiskLevel], n_sessions)
+    return pd.DataFrame(data)
+
+
+def benchmark(df: pd.DataFrame, output_format: str, work_dir: str) -> dict[str, float]:
+    """
+    Measures the write, transfer and load time of a calibration set in the given format
+    """
+    source = os.path.join(work_dir, f"train_set.bench.{output_format}")
+    destination_dir = os.path.join(work_dir, "received")
+    os.makedirs(destination_dir, exist_ok=True)
+    destination = os.path.join(destination_dir, os.path.basename(source))
+
+    start = time.perf_counter()
+    if output_format == "npz":
+        save_calibration_set(source, df)
+    else:
+        df.to_csv(source, index=False, encoding="utf-8")
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shutil.copyfile(source, destination)
+    transfer_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    x, y = NeuralNetwork.load_data(destination)
+    # Touch every value, so that memory mapped pages are actually read
+    _ = float(np.asarray(x).sum()) + float(np.asarray(y).sum())
+    load_time = time.perf_counter() - start
+
+    return {
+        "size_mb": os.path.getsize(source) / 2**20,
+        "write_s": write_time,
+        "transfer_s": transfer_time,
+        "load_s": load_time,
+        "total_s": write_time + transfer_time + load_time
+    }
+
+
+def main() -> None:
+    """
+    Entry point of the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Calibration set format benchmark")
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = generate_sessions(args.sessions)
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = {fmt: benchmark(df, fmt, work_dir) for fmt in ("csv", "npz")}
+
+    print(f"\n--- CALIBRATION SET BENCHMARK ({args.sessions} sessions) ---")
+    print(f"{'format':<8}{'size MB':>10}{'write s':>10}{'transfer s':>12}"
+          f"{'load s':>10}{'total s':>10}")
+    for fmt, r in results.items():
+        print(f"{fmt:<8}{r['size_mb']:>10.1f}{r['write_s']:>10.2f}{r['transfer_s']:>12.3f}"
+              f"{r['load_s']:>10.2f}{r['total_s']:>10.2f}")
+    print("----------------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,8 @@
 Defines the model for the data balancing report
 """
 
-from collections import Counter
+from collections.abc import Mapping
 
-from segregation_system.prepared_sessions_db import PreparedSession
 from shared.attack_risk_level import AttackRiskLevel
 
 class DataBalancingModel:
@@ -20,11 +19,10 @@ class DataBalancingModel:
     def __init__(
         self,
         balancing_tolerance: float,
-        sessions: list[PreparedSession]
+        label_counts: Mapping[str, int]
     ):
         self.balancing_tolerance = balancing_tolerance
-        counts = Counter(session.label for session in sessions)
         self.session_counts = {
-            level: counts[level]
+            level: label_counts.get(level.value, 0)
             for level in AttackRiskLevel
         }
@@ -21,10 +21,11 @@ class DataBalancingView:
     def __init__(self, output_dir: str):
         self.output_dir = output_dir
 
-    def build_report(self, model: DataBalancingModel) -> None:
+    def build_report(self, model: DataBalancingModel) -> str:
         """
         Generate a bar chart that provides a data balancing report based on session counts,
-        target sessions per class, and a specified tolerance for balancing
+        target sessions per class, and a specified tolerance for balancing.
+        Returns the path of the saved chart
         """
         labels = [AttackRiskLevel.NORMAL, AttackRiskLevel.MODERATE, AttackRiskLevel.HIGH]
         sessions = [
@@ -54,7 +55,9 @@ class DataBalancingView:
         os.makedirs(self.output_dir, exist_ok=True)
         output_file = f"{self.output_dir}/data_balancing_report.png"
         plt.savefig(output_file)
+        plt.close()
         print(f"[DataBalancingView] Data balancing report saved to '{output_file}'")
+        return output_file
 
     @staticmethod
     def read_user_input(service_flag: bool) -> None | dict[AttackRiskLevel, int]:
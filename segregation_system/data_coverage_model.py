@@ -2,18 +2,22 @@
 Defines the model for the data coverage report
 """
 
+from collections.abc import Mapping
 from typing import Final
 
 import numpy as np
 
-from segregation_system.prepared_sessions_db import PreparedSession
 from shared.feature import Feature
 
 class DataCoverageModel:
     """
     Represents the model for the data coverage report
 
-    :ivar normalized_features_samples: A dictionary that stores [0, 1] normalized feature samples
+    :ivar feature_histograms: A dictionary that stores the per-bin session counts of each
+        feature, the bins evenly split the feature bounds
+    :type feature_histograms: dict[Feature, np.ndarray]
+    :ivar normalized_features_samples: A dictionary that stores [0, 1] normalized feature
+        samples, empty if no samples were provided
     :type normalized_features_samples: dict[Feature, np.ndarray]
     """
 
@@ -27,18 +31,60 @@ class DataCoverageModel:
         Feature.MEDIAN_DESTINATION_IP: (0, 4294967295)
     }
 
-    def __init__(self, sessions: list[PreparedSession]):
-        self.normalized_features_samples = {}
+    @classmethod
+    def histogram_bounds(cls) -> dict[str, tuple[int, int]]:
+        """
+        Returns the feature bounds indexed by feature name, as expected by the
+        statistics of PreparedSessionsDB
+        """
+        return {feature.value: bounds for feature, bounds in cls.FEATURE_BOUNDS.items()}
 
-        if not sessions:
-            for feature in self.FEATURE_BOUNDS:
-                self.normalized_features_samples[feature] = np.array([])
-            return
+    def __init__(
+        self,
+        histograms: Mapping[str, np.ndarray],
+        features: Mapping[str, np.ndarray] | None = None
+    ):
+        """
+        :param histograms: Per-bin session counts indexed by feature name, as returned by
+            `PreparedSessionsDB.feature_histograms`
+        :param features: Optional feature columns (e.g. a DataFrame or the output of
+            `PreparedSessionsDB.get_feature_columns`) indexed by feature name
+        """
+        self.feature_histograms = {}
+        self.normalized_features_samples = {}
 
         for feature, (t_min, t_max) in self.FEATURE_BOUNDS.items():
-            raw_values = [getattr(s, feature.value) for s in sessions]
-            arr = np.array(raw_values, dtype=np.float32)
+            self.feature_histograms[feature] = np.asarray(histograms[feature.value])
+
+            if features is None:
+                self.normalized_features_samples[feature] = np.array([], dtype=np.float32)
+                continue
+            arr = np.asarray(features[feature.value], dtype=np.float32)
+            arr = arr[~np.isnan(arr)]  # Boolean indexing copies, the input is left untouched
             np.clip(arr, t_min, t_max, out=arr)
             arr -= t_min
             arr /= t_max - t_min
             self.normalized_features_samples[feature] = arr
+
+    def sample_count(self) -> int:
+        """
+        Returns the number of samples provided for the most populated feature
+        """
+        return max((len(s) for s in self.normalized_features_samples.values()), default=0)
+
+    def quantile(self, feature: Feature, q: float) -> float | None:
+        """
+        Estimates a [0, 1] normalized quantile of a feature from its histogram, assuming
+        samples are uniformly spread within each bin. Returns None if there are no samples
+        """
+        histogram = self.feature_histograms[feature]
+        total = int(histogram.sum())
+        if total == 0:
+            return None
+        cumulative = np.cumsum(histogram)
+        target = q * total
+        bin_index = int(np.searchsorted(cumulative, target, side="left"))
+        bin_index = min(bin_index, len(histogram) - 1)
+        previous = cumulative[bin_index - 1] if bin_index > 0 else 0
+        within = (target - previous) / histogram[bin_index] if histogram[bin_index] else 0.0
+        return float((bin_index + within) / len(histogram))
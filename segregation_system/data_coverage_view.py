@@ -4,7 +4,9 @@ Provides functionalities for visualizing the data coverage report as a radar cha
 
 import os
 import random
+from typing import Final
 
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 
@@ -18,13 +20,44 @@ class DataCoverageView:
 
     :ivar output_dir: The directory where the chart will be saved
     :type output_dir: str
+    :ivar scatter_max_samples: Maximum number of samples per feature for which every
+        sample is drawn (scatter mode). Above it, or without samples, the chart shows the
+        density of each feature (density mode), whose cost does not depend on the samples
+    :type scatter_max_samples: int
     """
-    def __init__(self, output_dir: str):
+
+    QUANTILE_BANDS: Final[tuple[float, ...]] = (0.05, 0.5, 0.95)
+
+    def __init__(self, output_dir: str, scatter_max_samples: int = 0):
         self.output_dir = output_dir
+        self.scatter_max_samples = scatter_max_samples
+
+    def build_report(self, model: DataCoverageModel) -> str:
+        """
+        Builds a radar chart based on the provided data coverage model.
+        Returns the path of the saved chart
+        """
+        sample_count = model.sample_count()
+        if 0 < sample_count <= self.scatter_max_samples:
+            fig = self._build_scatter_figure(model)
+        else:
+            fig = self._build_density_figure(model)
+
+        fig.update_layout(
+            polar={"radialaxis": {"visible": True, "range": [0, 1]}},
+            title="Data coverage report"
+        )
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_file = f"{self.output_dir}/data_coverage_report.png"
+        fig.write_image(output_file)
+        print(f"[DataCoverageView] Data coverage report saved to '{output_file}'")
+        return output_file
 
-    def build_report(self, model: DataCoverageModel) -> None:
+    @staticmethod
+    def _build_scatter_figure(model: DataCoverageModel) -> go.Figure:
         """
-        Builds a radar chart based on the provided data coverage model
+        Draws one marker per sample, only suitable for small datasets
         """
         flat_features = []
         flat_samples = []
@@ -48,17 +81,61 @@ class DataCoverageView:
                 fill=None,
             )
         )
+        fig.update_layout(showlegend=False)
+        return fig
 
-        fig.update_layout(
-            polar={"radialaxis": {"visible": True}},
-            showlegend=False,
-            title="Data coverage report"
-        )
+    def _build_density_figure(self, model: DataCoverageModel) -> go.Figure:
+        """
+        Draws each feature histogram as a radial heatmap, plus quantile bands
+        """
+        features = list(model.feature_histograms)
+        theta = [feature.name for feature in features]
+        bins = max(len(h) for h in model.feature_histograms.values())
 
-        os.makedirs(self.output_dir, exist_ok=True)
-        output_file = f"{self.output_dir}/data_coverage_report.png"
-        fig.write_image(output_file)
-        print(f"[DataCoverageView] Data coverage report saved to '{output_file}'")
+        # Densities are normalized per feature, so that sparse features remain visible
+        densities = []
+        for feature in features:
+            histogram = model.feature_histograms[feature].astype(np.float64)
+            peak = histogram.max()
+            densities.append(histogram / peak if peak > 0 else histogram)
+
+        fig = go.Figure()
+        for bin_index in range(bins):
+            fig.add_trace(
+                go.Barpolar(
+                    r=[1 / bins] * len(features),
+                    theta=theta,
+                    marker={
+                        "color": [d[bin_index] for d in densities],
+                        "colorscale": "Blues",
+                        "cmin": 0,
+                        "cmax": 1,
+                        "showscale": bin_index == 0,
+                        "colorbar": {"title": "Density"},
+                        "line": {"width": 0}
+                    },
+                    showlegend=False,
+                    hoverinfo="skip"
+                )
+            )
+
+        colors = px.colors.qualitative.Plotly
+        for i, q in enumerate(self.QUANTILE_BANDS):
+            radii = [model.quantile(feature, q) for feature in features]
+            fig.add_trace(
+                go.Scatterpolar(
+                    # Close the line by repeating the first point
+                    r=radii + radii[:1],
+                    theta=theta + theta[:1],
+                    mode="lines+markers",
+                    line={"color": colors[(i + 1) % len(colors)]},
+                    name=f"{int(q * 100)}th percentile",
+                    connectgaps=False
+                )
+            )
+
+        fig.update_layout(polar={"barmode": "stack", "bargap": 0})
+        return fig
 
     @staticmethod
     def read_user_input(service_flag: bool) -> None | dict[AttackRiskLevel, int]:
@@ -4,82 +4,172 @@ Module for splitting a dataset of prepared sessions into training, validation, a
 
 import os
 import uuid
+from collections.abc import Callable, Iterable
 from pathlib import Path
+from typing import Final
 
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
-from segregation_system.prepared_sessions_db import PreparedSession
+from shared.calibration_set import CalibrationSetWriter
 
 class DataSplitter:
     """
     Splits a dataset of prepared sessions into training, validation,
-    and test subsets based on user-defined percentage splits
+    and test subsets based on user-defined percentage splits.
 
+    The dataset is streamed in chunks, twice. Each session is assigned to a split by a
+    deterministic hash of its uuid, so splits are reproducible across runs. The first
+    pass builds, for each label, a histogram of the hashes, from which per-label cut
+    points matching the split percentages are derived: class ratios are preserved up to
+    the size of one hash bin (about 1/HASH_BINS of each class). The second pass writes
+    every chunk to the split files, so memory stays flat whatever the dataset size
+
+    :ivar HASH_BINS: Number of bins of the per-label hash histograms
+    :type HASH_BINS: int
     :ivar train_split_percentage: Percentage of the dataset to be used for training [0, 1]
     :type train_split_percentage: float
     :ivar validation_split_percentage: Percentage of the dataset to be used for validation [0, 1]
     :type validation_split_percentage: float
     :ivar test_split_percentage: Percentage of the dataset to be used for testing [0, 1]
     :type test_split_percentage: float
+    :ivar output_format: Format of the saved splits, either "csv" (human-readable) or
+        "npz" (binary columnar, see shared/calibration_set.py)
+    :type output_format: str
+    :ivar source: Stable key of this segregation system, in the name of every split
+        (<split>_set.<source>.<splits id>.<format>): the development system replaces the
+        pending calibration sets of a source with its newest ones
+    :type source: str
     """
 
+    HASH_BINS: Final[int] = 4096
+    SPLIT_NAMES: Final[tuple[str, ...]] = ("train", "validation", "test")
+
     def __init__(
         self,
         train_split_percentage: float,
         validation_split_percentage: float,
         test_split_percentage: float,
-        output_dir: str
+        output_dir: str,
+        output_format: str = "csv",
+        source: str = "default"
     ):
         self.train_split_percentage = train_split_percentage
         self.validation_split_percentage = validation_split_percentage
         self.test_split_percentage = test_split_percentage
         self.output_dir = output_dir
+        self.output_format = output_format
+        self.source = source
+
+    def _hash_bins(self, uuids: pd.Series) -> np.ndarray:
+        """
+        Maps each uuid to one of the HASH_BINS bins, using the top bits of a stable
+        64-bit hash (independent of the process and of the chunk)
+        """
+        hashes = pd.util.hash_pandas_object(uuids, index=False).to_numpy()
+        shift = np.uint64(64 - int(np.log2(self.HASH_BINS)))
+        return (hashes >> shift).astype(np.int64)
 
-    def split(self, sessions: list[PreparedSession]) -> list[str]:
+    @staticmethod
+    def _cut(cumulative: np.ndarray, target: float) -> int:
+        """
+        Returns the number of leading bins whose total is the closest to `target`
+        """
+        totals = np.concatenate(([0], cumulative))
+        return int(np.argmin(np.abs(totals - target)))
+
+    def _scan(
+        self,
+        chunks: Iterable[pd.DataFrame]
+    ) -> tuple[dict[str, tuple[int, int]], list[str]]:
         """
-        Splits a list of prepared sessions into training, validation, and test sets.
-        The splits are then saved into separate CSV files
+        First pass: returns the per-label cut points (train | validation | test) and
+        the feature columns without missing values
         """
-        df = pd.DataFrame([vars(s) for s in sessions])
-
-        initial_cols = len(df.columns)
-        df.dropna(axis=1, how='any', inplace=True)
-        non_na_cols = len(df.columns)
-        print(f"[DataSplitter] Dropped {initial_cols - non_na_cols} columns with missing values")
-
-        # First Split: Separate Train from the rest (Validation + Test)
-        train_df, temp_df = train_test_split(
-            df,
-            train_size=self.train_split_percentage,
-            shuffle=True
-        )
-
-        # Second Split: Separate Validation and Test from the 'temp_set'
-        # We must recalculate the split ratio relative to the remaining data
-        relative_test_size = (self.test_split_percentage /
-            (self.validation_split_percentage + self.test_split_percentage))
-        validation_df, test_df = train_test_split(
-            temp_df,
-            test_size=relative_test_size,
-            shuffle=True
-        )
-
-        output_files = []
+        histograms: dict[str, np.ndarray] = {}
+        columns: list[str] = []
+        na_columns: set[str] = set()
+        for chunk in chunks:
+            if not columns:
+                columns = list(chunk.columns)
+            na_columns.update(chunk.columns[chunk.isna().any()])
+            bins = self._hash_bins(chunk["uuid"])
+            for label, codes in pd.Series(bins).groupby(chunk["label"].to_numpy()):
+                counts = np.bincount(codes.to_numpy(), minlength=self.HASH_BINS)
+                histograms[label] = histograms.get(label, 0) + counts
+
+        cuts = {}
+        validation_end = self.train_split_percentage + self.validation_split_percentage
+        for label, histogram in histograms.items():
+            cumulative = np.cumsum(histogram)
+            total = cumulative[-1]
+            cuts[label] = (
+                self._cut(cumulative, total * self.train_split_percentage),
+                self._cut(cumulative, total * validation_end)
+            )
+        kept = [c for c in columns if c not in na_columns]
+        print(f"[DataSplitter] Dropped {len(columns) - len(kept)} columns with missing values")
+        return cuts, kept
+
+    def _open_writers(self, splits_id: uuid.UUID, columns: list[str]) -> dict[str, object]:
+        writers = {}
+        for split_name in self.SPLIT_NAMES:
+            path = (f"{self.output_dir}/{split_name}_set.{self.source}.{splits_id}."
+                    f"{self.output_format}")
+            if self.output_format == "npz":
+                features = [c for c in columns if c not in ("uuid", "label")]
+                writers[path] = CalibrationSetWriter(path, features)
+            else:
+                # Written with the header even if the split stays empty
+                pd.DataFrame(columns=columns).to_csv(path, index=False, encoding="utf-8")
+                writers[path] = None
+        return writers
+
+    def split_chunks(self, chunks: Callable[[], Iterable[pd.DataFrame]]) -> list[str]:
+        """
+        Splits a dataset of prepared sessions, streamed in DataFrame chunks, into training,
+        validation, and test sets saved into separate CSV or NPZ files.
+        `chunks` is called once per pass and must return the same sessions every time
+        """
+        cuts, columns = self._scan(chunks())
+
         splits_id = uuid.uuid4() # Avoids overwriting previous splits
         os.makedirs(self.output_dir, exist_ok=True)
+        writers = self._open_writers(splits_id, columns)
+        sizes = {path: pd.Series(dtype=np.int64) for path in writers}
+        try:
+            for chunk in chunks():
+                chunk = chunk[columns]
+                bins = self._hash_bins(chunk["uuid"])
+                labels = chunk["label"].map(cuts)
+                train_end = labels.str[0].to_numpy()
+                validation_end = labels.str[1].to_numpy()
+                split_index = np.where(bins < train_end, 0, np.where(bins < validation_end, 1, 2))
+                for index, (path, writer) in enumerate(writers.items()):
+                    part = chunk[split_index == index]
+                    if writer is None:
+                        part.to_csv(path, mode="a", header=False, index=False, encoding="utf-8")
+                    else:
+                        writer.write(part)
+                    sizes[path] = sizes[path].add(part["label"].value_counts(), fill_value=0)
+        finally:
+            for writer in writers.values():
+                if writer is not None:
+                    writer.close()
+
+        totals = pd.concat(sizes.values(), axis=1).sum(axis=1)
+        for path, counts in sizes.items():
+            ratios = (counts / totals).round(3).to_dict()
+            print(f"[DataSplitter] Saved {int(counts.sum())} sessions to '{path}' "
+                  f"(label ratios {ratios})")
+        return list(writers)
 
-        datasets = {
-            "train": train_df,
-            "validation": validation_df,
-            "test": test_df
-        }
-        for split_name, split_df in datasets.items():
-            path = f"{self.output_dir}/{split_name}_set.{splits_id}.csv"
-            split_df.to_csv(path, index=False, encoding="utf-8")
-            print(f"[DataSplitter] Saved {len(split_df)} sessions to '{path}'")
-            output_files.append(path)
-        return output_files
+    def split(self, dataset: pd.DataFrame) -> list[str]:
+        """
+        Splits an in-memory column-oriented dataset of prepared sessions into training,
+        validation, and test sets. The splits are then saved into separate CSV or NPZ files
+        """
+        return self.split_chunks(lambda: [dataset])
 
     @staticmethod
     def delete(paths: list[str]) -> None:
@@ -0,0 +1,60 @@
+"""
+Per-label quotas used to admit only the requested prepared sessions
+"""
+
+import threading
+from collections.abc import Mapping
+from typing import Any
+
+from shared.attack_risk_level import AttackRiskLevel
+
+
+class LabelQuota:
+    """
+    Thread-safe per-label quotas, checked at the segregation ingress before schema
+    validation. While no quota is published every session is admitted, otherwise only
+    sessions whose label still has quota left are, and each admission consumes one unit
+
+    :ivar rejected: Number of sessions rejected since the last publication
+    :type rejected: int
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining: dict[str, int] | None = None
+        self.rejected = 0
+
+    def publish(self, quotas: Mapping[str, int] | None) -> None:
+        """
+        Publishes the number of sessions still needed per label, or None to admit all
+        """
+        with self._lock:
+            self._remaining = None if quotas is None else {
+                AttackRiskLevel(label).value: max(0, int(count))
+                for label, count in quotas.items()
+            }
+            self.rejected = 0
+
+    def admit(self, data: Any) -> bool:
+        """
+        Decides whether a raw prepared session payload is admitted, consuming one unit
+        of quota of its label if so
+        """
+        with self._lock:
+            if self._remaining is None:
+                return True
+            if not isinstance(data, dict) or data.get("duplicate"):
+                self.rejected += 1
+                return False
+            label = data.get("label")
+            if self._remaining.get(label, 0) <= 0:
+                self.rejected += 1
+                return False
+            self._remaining[label] -= 1
+            return True
+
+    def exhausted(self) -> bool:
+        """
+        Returns whether every published quota has been consumed
+        """
+        with self._lock:
+            return self._remaining is not None and sum(self._remaining.values()) == 0
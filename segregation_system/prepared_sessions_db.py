@@ -2,8 +2,14 @@
 A module for managing a database of prepared sessions
 """
 
+from collections.abc import Iterator, Mapping
 from dataclasses import dataclass
+import random
 import sqlite3
+from typing import Final
+
+import numpy as np
+import pandas as pd
 
 from shared.attack_risk_level import AttackRiskLevel
 
@@ -23,19 +29,116 @@ class PreparedSession:
 
 class PreparedSessionsDB:
     """
-    Manages a database for storing and retrieving prepared sessions
+    Manages a database for storing and retrieving prepared sessions.
+    The database runs in WAL journal mode, so that bulk writes cost a single fsync
+    per transaction (or none, depending on the synchronous level).
+
+    Per-label counts and, when histogram bounds are given, per-feature fixed-bin
+    histograms are maintained incrementally by SQLite triggers as sessions are stored,
+    replaced or deleted, so they can be read without scanning the sessions.
+    The triggers and the statistics belong to the segregation system: other writers
+    (e.g. the backfill) open the database without `manage_statistics`, so they store
+    sessions through the installed triggers and never replace or rebuild them.
+
+    With a reservoir size, at most that many sessions are kept per label: each label is
+    a separate reservoir (Algorithm R), so the stored sessions of a label are a uniform
+    sample of all the sessions of that label stored since the last deletion, and the
+    dataset size is bounded whatever the traffic. While a split is pending, the sessions
+    up to its held watermark are left out of the reservoirs, on top of their size, and
+    only the later sessions are sampled
 
     :ivar conn: The active SQLite connection used to communicate with the database
     :type conn: sqlite3.Connection
+    :ivar histogram_bounds: Feature column -> (min, max) range covered by its histogram.
+        Values outside the range are counted in the first or last bin
+    :type histogram_bounds: dict[str, tuple[float, float]]
+    :ivar histogram_bins: Number of bins of every feature histogram
+    :type histogram_bins: int
+    :ivar manage_statistics: Whether this connection installs the statistics triggers
+        and rebuilds the statistics when opening the database
+    :type manage_statistics: bool
+    :ivar reservoir_size: Maximum number of sessions kept per label, None for no limit
+    :type reservoir_size: int | None
+    :ivar rng: Random generator choosing which sessions enter the reservoirs
+    :type rng: random.Random
     """
 
-    def __init__(self, database_name: str = "segregation_system/prepared_sessions.db"):
+    FEATURE_COLUMNS: Final[tuple[str, ...]] = (
+        "mad_timestamps",
+        "mad_amounts",
+        "median_longitude",
+        "median_latitude",
+        "median_source_ip",
+        "median_destination_ip"
+    )
+
+    DEFAULT_CHUNK_SIZE: Final[int] = 100_000
+
+    SYNCHRONOUS_LEVELS: Final[tuple[str, ...]] = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    STORE_QUERY: Final[str] = """
+    INSERT INTO prepared_sessions (
+        uuid,
+        mad_timestamps,
+        mad_amounts,
+        median_longitude,
+        median_latitude,
+        median_source_ip,
+        median_destination_ip,
+        label
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (uuid) DO UPDATE SET
+        mad_timestamps = excluded.mad_timestamps,
+        mad_amounts = excluded.mad_amounts,
+        median_longitude = excluded.median_longitude,
+        median_latitude = excluded.median_latitude,
+        median_source_ip = excluded.median_source_ip,
+        median_destination_ip = excluded.median_destination_ip,
+        label = excluded.label
+    """
+
+    def __init__(
+        self,
+        database_name: str = "segregation_system/prepared_sessions.db",
+        synchronous: str = "NORMAL",
+        histogram_bounds: Mapping[str, tuple[float, float]] | None = None,
+        histogram_bins: int = 20,
+        reservoir_size: int | None = None,
+        manage_statistics: bool = True
+    ):
+        if synchronous.upper() not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid synchronous level '{synchronous}', "
+                             f"expected one of {self.SYNCHRONOUS_LEVELS}")
+        self.histogram_bounds = dict(histogram_bounds or {})
+        self.histogram_bins = histogram_bins
+        if reservoir_size is not None and reservoir_size < 1:
+            raise ValueError(f"Invalid reservoir size {reservoir_size}, expected at least 1")
+        self.reservoir_size = reservoir_size
+        self.manage_statistics = manage_statistics
+        self.rng = random.Random()
+        unknown = set(self.histogram_bounds) - set(self.FEATURE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown histogram features {sorted(unknown)}")
         self.conn = sqlite3.connect(database_name)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous.upper()}")
         self._create_schema()
+        if self.manage_statistics:
+            self._create_statistics()
+        else:
+            self._create_statistics_tables()
+            if self.reservoir_size is not None and not self._has_statistics_triggers():
+                # Without the triggers the label counts are not maintained, the
+                # segregation system shrinks the labels when it opens the database
+                print("[SessionsDB] Statistics not installed, reservoir sampling disabled")
+                self.reservoir_size = None
+        if self.reservoir_size is not None:
+            self._create_reservoirs()
 
     def _create_schema(self) -> None:
         """
-        Creates the `prepared_sessions` table in the database if it does not already exist
+        Creates the `prepared_sessions` table, and the single-row table of the watermark
+        held by the pending split, in the database if they do not already exist
         """
         query = """
         CREATE TABLE IF NOT EXISTS prepared_sessions (
@@ -48,28 +151,227 @@ class PreparedSessionsDB:
             median_destination_ip INTEGER,
             label VARCHAR(32)
         );
+        CREATE TABLE IF NOT EXISTS held_watermark (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            rowid_value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO held_watermark (id, rowid_value) VALUES (0, 0);
         """
         with self.conn:
-            self.conn.execute(query)
+            self.conn.executescript(query)
 
-    def store(self, prepared_session: PreparedSession) -> None:
+    def _bin_expression(self, column: str) -> str:
         """
-        Stores a prepared session into the database
+        Returns the SQL expression of the histogram bin of a `NEW`/`OLD` prefixed column
         """
-        query = """
-        INSERT INTO prepared_sessions (
-            uuid,
-            mad_timestamps, 
-            mad_amounts, 
-            median_longitude, 
-            median_latitude,
-            median_source_ip, 
-            median_destination_ip,
-            label
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
-        values = (
+        feature = column.split(".")[-1]
+        t_min, t_max = self.histogram_bounds[feature]
+        bins = self.histogram_bins
+        return (f"MIN({bins - 1}, MAX(0, CAST(({column} - {float(t_min)!r}) * {bins} / "
+                f"{float(t_max - t_min)!r} AS INTEGER)))")
+
+    def _statistics_statements(self, row: str, sign: int) -> list[str]:
+        """
+        Returns the statements adding (`sign` = 1) or removing (`sign` = -1) the
+        contribution of the `NEW` or `OLD` row to the statistics tables
+        """
+        statements = [f"""
+            INSERT INTO label_counts (label, count) SELECT {row}.label, {sign} WHERE true
+            ON CONFLICT (label) DO UPDATE SET count = count + ({sign});"""]
+        for feature in self.histogram_bounds:
+            statements.append(f"""
+            INSERT INTO feature_histograms (feature, bin, count)
+            SELECT '{feature}', {self._bin_expression(f"{row}.{feature}")}, {sign}
+            WHERE {row}.{feature} IS NOT NULL
+            ON CONFLICT (feature, bin) DO UPDATE SET count = count + ({sign});""")
+        return statements
+
+    def _create_statistics_tables(self) -> None:
+        """
+        Creates the statistics tables if they do not already exist
+        """
+        with self.conn:
+            self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS label_counts (
+                label VARCHAR(32) PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS feature_histograms (
+                feature VARCHAR(32),
+                bin INTEGER,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (feature, bin)
+            );
+            """)
+
+    def _has_statistics_triggers(self) -> bool:
+        """
+        Whether the statistics triggers were installed in the database
+        """
+        cursor = self.conn.execute("""
+        SELECT 1 FROM sqlite_master
+        WHERE type = 'trigger' AND name = 'prepared_sessions_insert_statistics'
+        """)
+        return cursor.fetchone() is not None
+
+    def _create_statistics(self) -> None:
+        """
+        Creates the statistics tables and their maintenance triggers, then rebuilds the
+        statistics from the stored sessions, since the bounds or bins may have changed
+        """
+        self._create_statistics_tables()
+        insert = self._statistics_statements("NEW", 1)
+        delete = self._statistics_statements("OLD", -1)
+        with self.conn:
+            self.conn.executescript(f"""
+            DROP TABLE IF EXISTS feature_extrema;
+            DROP TRIGGER IF EXISTS prepared_sessions_insert_statistics;
+            DROP TRIGGER IF EXISTS prepared_sessions_delete_statistics;
+            DROP TRIGGER IF EXISTS prepared_sessions_update_statistics;
+            CREATE TRIGGER prepared_sessions_insert_statistics
+            AFTER INSERT ON prepared_sessions BEGIN {"".join(insert)}
+            END;
+            CREATE TRIGGER prepared_sessions_delete_statistics
+            AFTER DELETE ON prepared_sessions BEGIN {"".join(delete)}
+            END;
+            CREATE TRIGGER prepared_sessions_update_statistics
+            AFTER UPDATE ON prepared_sessions BEGIN {"".join(delete + insert)}
+            END;
+            DELETE FROM label_counts;
+            DELETE FROM feature_histograms;
+            INSERT INTO label_counts (label, count)
+            SELECT label, COUNT(*) FROM prepared_sessions GROUP BY label;
+            """)
+            for feature in self.histogram_bounds:
+                self.conn.execute(f"""
+                INSERT INTO feature_histograms (feature, bin, count)
+                SELECT '{feature}', {self._bin_expression(feature)}, COUNT(*)
+                FROM prepared_sessions WHERE {feature} IS NOT NULL GROUP BY 2
+                """)
+
+    def _create_reservoirs(self) -> None:
+        """
+        Creates the per-label counts of sessions seen by the reservoirs and the reservoir
+        slots, and shrinks the labels holding more sessions than the reservoir size to a
+        random sample of it. Only the sessions after the held watermark are sampled
+        """
+        with self.conn:
+            self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reservoir_seen (
+                label VARCHAR(32) PRIMARY KEY,
+                seen INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reservoir_slots (
+                label VARCHAR(32),
+                slot INTEGER,
+                session_rowid INTEGER NOT NULL,
+                PRIMARY KEY (label, slot)
+            );
+            CREATE INDEX IF NOT EXISTS prepared_sessions_label ON prepared_sessions (label);
+            """)
+            counts = self.conn.execute("""
+            SELECT label, COUNT(*) FROM prepared_sessions
+            WHERE rowid > (SELECT rowid_value FROM held_watermark) GROUP BY label
+            """).fetchall()
+            for label, count in counts:
+                self.conn.execute("""
+                INSERT INTO reservoir_seen (label, seen) VALUES (?, ?)
+                ON CONFLICT (label) DO UPDATE SET seen = MAX(seen, excluded.seen)
+                """, (label, count))
+                if count > self.reservoir_size:
+                    self.conn.execute("""
+                    DELETE FROM prepared_sessions WHERE rowid IN (
+                        SELECT rowid FROM prepared_sessions
+                        WHERE label = ? AND rowid > (SELECT rowid_value FROM held_watermark)
+                        ORDER BY RANDOM() LIMIT ?
+                    )""", (label, count - self.reservoir_size))
+            self._number_slots()
+
+    def _number_slots(self) -> None:
+        """
+        Assigns the sessions of each label stored after the held watermark to the
+        reservoir slots 0, 1, ...
+        """
+        self.conn.execute("DELETE FROM reservoir_slots")
+        self.conn.execute("""
+        INSERT INTO reservoir_slots (label, slot, session_rowid)
+        SELECT label, ROW_NUMBER() OVER (PARTITION BY label ORDER BY rowid) - 1, rowid
+        FROM prepared_sessions WHERE rowid > (SELECT rowid_value FROM held_watermark)
+        """)
+
+    def _reset_reservoirs(self) -> None:
+        """
+        Restarts the reservoirs from the sessions stored after the held watermark, e.g.
+        after a deletion or when a new watermark is held
+        """
+        if self._has_reservoirs():
+            self._number_slots()
+            self.conn.execute("DELETE FROM reservoir_seen")
+            self.conn.execute("""
+            INSERT INTO reservoir_seen (label, seen)
+            SELECT label, MAX(slot) + 1 FROM reservoir_slots GROUP BY label
+            """)
+
+    def _has_reservoirs(self) -> bool:
+        """
+        Whether the reservoir tables exist, i.e. some connection samples the sessions
+        """
+        cursor = self.conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reservoir_slots'
+        """)
+        return cursor.fetchone() is not None
+
+    def _store_sampled(self, row: tuple) -> None:
+        """
+        Offers a session to the reservoir of its label, within the current transaction.
+        Once the reservoir is full, the n-th session of the label replaces the session in
+        a random slot with probability reservoir_size / n, and is discarded otherwise.
+        The slots only hold sessions stored after the held watermark, so the sessions of
+        the pending split are never evicted
+        """
+        uuid, label = row[0], row[-1]
+        stored = self.conn.execute(
+            "SELECT 1 FROM prepared_sessions WHERE uuid = ?", (uuid,)
+        ).fetchone()
+        if stored is not None:
+            # A replacement of a stored session is not a new sample of the stream
+            self.conn.execute(self.STORE_QUERY, row)
+            return
+
+        self.conn.execute("""
+        INSERT INTO reservoir_seen (label, seen) VALUES (?, 1)
+        ON CONFLICT (label) DO UPDATE SET seen = seen + 1
+        """, (label,))
+        seen = self.conn.execute(
+            "SELECT seen FROM reservoir_seen WHERE label = ?", (label,)
+        ).fetchone()[0]
+        filled = self.conn.execute(
+            "SELECT COALESCE(MAX(slot) + 1, 0) FROM reservoir_slots WHERE label = ?", (label,)
+        ).fetchone()[0]
+        if filled < self.reservoir_size:
+            rowid = self.conn.execute(self.STORE_QUERY, row).lastrowid
+            self.conn.execute(
+                "INSERT INTO reservoir_slots (label, slot, session_rowid) VALUES (?, ?, ?)",
+                (label, filled, rowid)
+            )
+            return
+        j = self.rng.randrange(seen)
+        if j >= self.reservoir_size:
+            return
+        evicted = self.conn.execute(
+            "SELECT session_rowid FROM reservoir_slots WHERE label = ? AND slot = ?", (label, j)
+        ).fetchone()
+        # The triggers update the statistics
+        self.conn.execute("DELETE FROM prepared_sessions WHERE rowid = ?", evicted)
+        rowid = self.conn.execute(self.STORE_QUERY, row).lastrowid
+        self.conn.execute(
+            "UPDATE reservoir_slots SET session_rowid = ? WHERE label = ? AND slot = ?",
+            (rowid, label, j)
+        )
+
+    @staticmethod
+    def _to_row(prepared_session: PreparedSession) -> tuple:
+        return (
             prepared_session.uuid,
             prepared_session.mad_timestamps,
             prepared_session.mad_amounts,
@@ -80,38 +382,147 @@ class PreparedSessionsDB:
             prepared_session.label
         )
 
-        with self.conn:
-            self.conn.execute(query, values)
+    def store(self, prepared_session: PreparedSession) -> None:
+        """
+        Stores a prepared session into the database.
+        A session with an already stored uuid replaces the previous one
+        """
+        self.store_many([prepared_session])
         #print(f"[SessionsDB] Stored {prepared_session} session in the database")
 
-    def get_all(self) -> list[PreparedSession]:
+    def store_many(self, prepared_sessions: list[PreparedSession]) -> None:
         """
-        Retrieves all prepared sessions from the database
+        Stores a batch of prepared sessions into the database within a single transaction.
+        Sessions with an already stored uuid replace the previous ones
         """
-        query = """
-        SELECT *
+        if not prepared_sessions:
+            return
+        if self.reservoir_size is not None:
+            with self.conn:
+                for session in prepared_sessions:
+                    self._store_sampled(self._to_row(session))
+            return
+        with self.conn:
+            self.conn.executemany(
+                self.STORE_QUERY,
+                (self._to_row(session) for session in prepared_sessions)
+            )
+        #print(f"[SessionsDB] Stored {len(prepared_sessions)} sessions in the database")
+
+    def hold_watermark(self) -> int:
+        """
+        Returns the highest rowid among the stored sessions (0 if there are none) as the
+        watermark of the pending split: sessions stored afterwards get a higher rowid.
+        The sessions up to it are protected from reservoir eviction (by any connection)
+        until they are deleted by `delete_up_to`: the reservoirs restart from the sessions
+        stored afterwards
+        """
+        with self.conn:
+            self.conn.execute("""
+            UPDATE held_watermark SET rowid_value = (
+                SELECT COALESCE(MAX(rowid), 0) FROM prepared_sessions
+            )""")
+            self._reset_reservoirs()
+            return self.conn.execute("SELECT rowid_value FROM held_watermark").fetchone()[0]
+
+    def iter_chunks(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        up_to_rowid: int | None = None,
+        after_rowid: int = 0
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Streams the prepared sessions as DataFrames of at most `chunk_size` rows,
+        without building a Python object per session.
+        Only sessions with `after_rowid` < rowid <= `up_to_rowid` (if given) are returned
+        """
+        query = f"""
+        SELECT uuid, {", ".join(self.FEATURE_COLUMNS)}, label
         FROM prepared_sessions
+        WHERE rowid > ? AND (? IS NULL OR rowid <= ?)
+        """
+        params = (after_rowid, up_to_rowid, up_to_rowid)
+        yield from pd.read_sql_query(query, self.conn, params=params, chunksize=chunk_size)
+
+    def get_feature_columns(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        up_to_rowid: int | None = None
+    ) -> dict[str, np.ndarray]:
+        """
+        Retrieves every feature column of the sessions with rowid <= `up_to_rowid`
+        (all of them by default) as a float32 NumPy array, read in chunks.
+        Missing values are returned as NaN
+        """
+        query = f"""
+        SELECT {", ".join(self.FEATURE_COLUMNS)} FROM prepared_sessions
+        WHERE ? IS NULL OR rowid <= ?
         """
+        total = self.count(up_to_rowid)
+        columns = {name: np.empty(total, dtype=np.float32) for name in self.FEATURE_COLUMNS}
 
         cursor = self.conn.cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-        results = []
-        for row in rows:
-            session = PreparedSession(
-                uuid=row[0],
-                mad_timestamps=row[1],
-                mad_amounts=row[2],
-                median_longitude=row[3],
-                median_latitude=row[4],
-                median_source_ip=row[5],
-                median_destination_ip = row[6],
-                label = row[7]
-            )
-            results.append(session)
-        print(f"[SessionsDB] Loaded {len(results)} sessions from the database")
-        return results
+        cursor.execute(query, (up_to_rowid, up_to_rowid))
+        offset = 0
+        while offset < total:
+            rows = cursor.fetchmany(min(chunk_size, total - offset))
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.float32)
+            for i, name in enumerate(self.FEATURE_COLUMNS):
+                columns[name][offset:offset + len(rows)] = block[:, i]
+            offset += len(rows)
+        print(f"[SessionsDB] Loaded {offset} sessions from the database")
+        return {name: column[:offset] for name, column in columns.items()}
+
+    def count_by_label(self, up_to_rowid: int | None = None) -> dict[str, int]:
+        """
+        Returns the number of prepared sessions stored for each label.
+        Read from the incrementally maintained counts, without scanning the sessions.
+        With a watermark, the sessions stored after it (a short rowid range) are
+        subtracted within the same statement, so the counts match `up_to_rowid`
+        """
+        query = """
+        SELECT label, SUM(count) FROM (
+            SELECT label, count FROM label_counts
+            UNION ALL
+            SELECT label, -COUNT(*) FROM prepared_sessions WHERE rowid > ? GROUP BY label
+        ) GROUP BY label HAVING SUM(count) > 0
+        """
+        if up_to_rowid is None:
+            query = "SELECT label, count FROM label_counts WHERE count > 0"
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, () if up_to_rowid is None else (up_to_rowid,))
+        return dict(cursor.fetchall())
+
+    def feature_histograms(self, up_to_rowid: int | None = None) -> dict[str, np.ndarray]:
+        """
+        Returns the per-bin session counts of every feature with histogram bounds.
+        Read from the incrementally maintained histograms, without scanning the sessions.
+        With a watermark, the sessions stored after it are subtracted as in
+        `count_by_label`
+        """
+        histograms = {
+            feature: np.zeros(self.histogram_bins, dtype=np.int64)
+            for feature in self.histogram_bounds
+        }
+        recent = "" if up_to_rowid is None else "".join(f"""
+            UNION ALL
+            SELECT '{feature}', {self._bin_expression(feature)}, -COUNT(*)
+            FROM prepared_sessions WHERE rowid > ? AND {feature} IS NOT NULL GROUP BY 2"""
+            for feature in self.histogram_bounds)
+        query = f"""
+        SELECT feature, bin, SUM(count) FROM (
+            SELECT feature, bin, count FROM feature_histograms{recent}
+        ) GROUP BY feature, bin
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(query, () if up_to_rowid is None else (up_to_rowid,) * len(histograms))
+        for feature, bin_index, count in cursor.fetchall():
+            if feature in histograms:
+                histograms[feature][bin_index] = count
+        return histograms
 
     def delete_all(self) -> None:
         """
@@ -121,16 +532,32 @@ class PreparedSessionsDB:
 
         with self.conn:
             self.conn.execute(query)
+            self.conn.execute("DELETE FROM label_counts")
+            self.conn.execute("DELETE FROM feature_histograms")
+            self.conn.execute("UPDATE held_watermark SET rowid_value = 0")
+            self._reset_reservoirs()
         print("[SessionsDB] Deleted all sessions from the database")
 
-    def count(self) -> int:
+    def delete_up_to(self, rowid: int) -> None:
+        """
+        Deletes the prepared sessions up to the given rowid watermark, keeping the
+        sessions stored afterwards, and releases the held watermark
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM prepared_sessions WHERE rowid <= ?", (rowid,))
+            self.conn.execute("UPDATE held_watermark SET rowid_value = 0")
+            self._reset_reservoirs()
+        print(f"[SessionsDB] Deleted sessions up to rowid {rowid} from the database")
+
+    def count(self, up_to_rowid: int | None = None) -> int:
         """
-        Returns the total number of prepared sessions stored in the database
+        Returns the number of prepared sessions with rowid <= `up_to_rowid`
+        (all of them by default) stored in the database
         """
-        query = "SELECT COUNT(*) FROM prepared_sessions"
+        query = "SELECT COUNT(*) FROM prepared_sessions WHERE ? IS NULL OR rowid <= ?"
 
         cursor = self.conn.cursor()
-        cursor.execute(query)
+        cursor.execute(query, (up_to_rowid, up_to_rowid))
         result = cursor.fetchone()
 
         # fetchone() returns a tuple like (N,), so we return the first element
@@ -0,0 +1,80 @@
+"""
+A persistent background process rendering the segregation reports
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+from typing import Any, Protocol
+
+
+class ReportView(Protocol):  # pylint: disable=too-few-public-methods
+    """
+    Any view whose `build_report` renders a model to a file and returns its path
+    """
+    def build_report(self, model: Any) -> str:
+        """
+        Renders the report of the model and returns the path of the output file
+        """
+
+
+def _warm_up() -> None:
+    """
+    Imports the plotting libraries once per renderer process.
+    The kaleido sync server is not started: its browser runs in a separate thread, so
+    a browser that fails to start would hang every render instead of raising
+    """
+    # pylint: disable=import-outside-toplevel
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # pylint: disable=unused-import
+    import plotly.graph_objects  # pylint: disable=unused-import
+
+
+def _render(view: ReportView, model: Any) -> str:
+    return view.build_report(model)
+
+
+class ReportRenderer:
+    """
+    Renders reports in a single persistent worker process, so that the caller can keep
+    working while matplotlib and plotly/kaleido produce the charts.
+    The process is spawned (not forked) because the caller runs Flask threads
+
+    :ivar executor: The single-worker process pool used for rendering
+    :type executor: ProcessPoolExecutor
+    """
+    def __init__(self):
+        self.executor = self._create_executor()
+
+    @staticmethod
+    def _create_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up
+        )
+
+    def submit(self, view: ReportView, model: Any) -> Future:
+        """
+        Schedules the rendering of a report, the future resolves to the output path
+        """
+        return self.executor.submit(_render, view, model)
+
+    def restart(self) -> None:
+        """
+        Kills the renderer process, e.g. when a report takes too long, cancelling the
+        pending reports, and starts a new one
+        """
+        processes = list(self.executor._processes.values())  # pylint: disable=protected-access
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.kill()
+            process.join()
+        self.executor = self._create_executor()
+        print("[ReportRenderer] Renderer process restarted")
+
+    def shutdown(self) -> None:
+        """
+        Waits for pending reports and stops the renderer process
+        """
+        self.executor.shutdown(wait=True)
@@ -2,6 +2,7 @@
 The controller module for the segregation system
 """
 
+import time
 from typing import Final
 
 from shared.loader import load_and_validate_json_file
@@ -15,6 +16,8 @@ from segregation_system.data_coverage_model import DataCoverageModel
 from segregation_system.data_coverage_view import DataCoverageView
 from segregation_system.data_splitter import DataSplitter
 from segregation_system.prepared_sessions_db import PreparedSessionsDB, PreparedSession
+from segregation_system.report_renderer import ReportRenderer
+from segregation_system.label_quota import LabelQuota
 
 class SegregationSystemController:
     """
@@ -48,14 +51,28 @@ class SegregationSystemController:
     :ivar data_coverage_view: View object generating and handling reports
         relating to data coverage analysis
     :type data_coverage_view: DataCoverageView
+    :ivar renderer: Background process rendering the reports, so that prepared
+        sessions keep being received and stored meanwhile
+    :type renderer: ReportRenderer
+    :ivar render_timeout: Seconds after which a report still rendering is abandoned
+        and the renderer process is restarted
+    :type render_timeout: float
+    :ivar buffer: Received sessions waiting to be stored in a single batch
+    :type buffer: list[PreparedSession]
+    :ivar quota: Per-label quotas checked at the ingress, published while collecting
+        the additional sessions requested by the reports
+    :type quota: LabelQuota
     """
 
+    CONFIG_PATH: Final[str] = "segregation_system/configuration.json"
+    CONFIG_SCHEMA_PATH: Final[str] = "segregation_system/schemas/configuration.schema.json"
     OUTPUT_DIR: Final[str] = "segregation_system/output"
+    RENDER_POLL_SECONDS: Final[float] = 0.1
 
     def __init__(self):
         self.configuration = load_and_validate_json_file(
-            "segregation_system/configuration.json",
-            "segregation_system/schemas/configuration.schema.json"
+            self.CONFIG_PATH,
+            self.CONFIG_SCHEMA_PATH
         )
         self.configuration |= load_and_validate_json_file(
             "shared/json/shared_config.json",
@@ -73,66 +90,167 @@ class SegregationSystemController:
                       "segregation_system/schemas/prepared_session.schema.json")],
             self.configuration["addresses"]["segregationSystem"]["port"],
         )
-        self.sessions_db = PreparedSessionsDB()
+        self.quota = LabelQuota()
+        self.io.set_admission_filter("/prepared-session", self.quota.admit)
+        self.sessions_db = PreparedSessionsDB(
+            synchronous=self.configuration["databaseSynchronous"],
+            histogram_bounds=DataCoverageModel.histogram_bounds(),
+            histogram_bins=self.configuration["coverageHistogramBins"],
+            # 0 keeps every session until it is sent in a split
+            reservoir_size=self.configuration["reservoirMaxSessionsPerLabel"] or None
+        )
         self.splitter = DataSplitter(
             self.configuration["trainSplitPercentage"],
-            self.configuration["testSplitPercentage"],
             self.configuration["validationSplitPercentage"],
-            self.OUTPUT_DIR
+            self.configuration["testSplitPercentage"],
+            self.OUTPUT_DIR,
+            self.configuration["calibrationSetFormat"],
+            self.configuration["calibrationSetSource"]
         )
         self.data_balancing_view = DataBalancingView(self.OUTPUT_DIR)
-        self.data_coverage_view = DataCoverageView(self.OUTPUT_DIR)
+        self.data_coverage_view = DataCoverageView(
+            self.OUTPUT_DIR,
+            self.configuration["coverageScatterMaxSamples"]
+        )
+        self.renderer = ReportRenderer()
+        self.render_timeout = float(self.configuration["reportRenderTimeoutSeconds"])
 
-    def run(self, requested_sessions: dict[AttackRiskLevel, int] = None) -> None:
+        self.flush_count = int(self.configuration["storeFlushCount"])
+        self.flush_interval = float(self.configuration["storeFlushIntervalSeconds"])
+        self.flush_deadline = time.monotonic() + self.flush_interval
+        self.buffer: list[PreparedSession] = []
+
+    def _receive_session(self, timeout: float) -> PreparedSession | None:
         """
-        Executes the main workflow for managing session preparation and processing
+        Waits at most `timeout` seconds for a prepared session. Returns None if none
+        arrived or if it is a duplicate, already stored when its original was received
+        """
+        prepared_session_data = self.io.receive("/prepared-session", timeout=timeout)
+        if prepared_session_data is None:
+            return None
+        if prepared_session_data.pop("duplicate", False):
+            return None
+        return PreparedSession(**prepared_session_data)
+
+    def _flush(self, force: bool = False) -> None:
+        """
+        Stores the buffered sessions if the buffer is full, if the flush interval
+        elapsed, or if forced
+        """
+        if (force or len(self.buffer) >= self.flush_count
+                or time.monotonic() >= self.flush_deadline):
+            self.sessions_db.store_many(self.buffer)
+            self.buffer.clear()
+            self.flush_deadline = time.monotonic() + self.flush_interval
+
+    def _render_report(self, view: DataBalancingView | DataCoverageView, model) -> str:
+        """
+        Renders a report in the background renderer process, while continuing to
+        receive and store prepared sessions. Returns the path of the report.
+        Raises the rendering error, or TimeoutError (after restarting the renderer)
+        if the report is not rendered within the render timeout
+        """
+        future = self.renderer.submit(view, model)
+        deadline = time.monotonic() + self.render_timeout
+        while not future.done():
+            if time.monotonic() >= deadline:
+                self._flush(force=True)
+                self.renderer.restart()
+                raise TimeoutError(f"Report not rendered within {self.render_timeout} seconds")
+            prepared_session = self._receive_session(self.RENDER_POLL_SECONDS)
+            if prepared_session is not None:
+                self.buffer.append(prepared_session)
+            self._flush()
+        self._flush(force=True)
+        return future.result()
+
+    def _collect_minimum_sessions(self) -> None:
+        """
+        Receives prepared sessions until the database holds the minimum number of sessions
         """
         received_sessions = self.sessions_db.count()
         print(f"[Controller] Initially loaded {received_sessions} sessions from the database")
         minimum_number_of_sessions = int(self.configuration["minimumNumberOfSessions"])
+
+        # Sessions are buffered and stored in batches, flushed by count or by time
+        while received_sessions < minimum_number_of_sessions:
+            self._flush()
+            prepared_session = self._receive_session(
+                max(0.0, self.flush_deadline - time.monotonic())
+            )
+            if prepared_session is not None:
+                received_sessions += 1
+                self.buffer.append(prepared_session)
+        self._flush(force=True)
+
+    def _collect_requested_sessions(self, requested_sessions: dict[AttackRiskLevel, int]) -> None:
+        """
+        Publishes the requested sessions as per-label quotas, so that the ingress skips
+        unneeded sessions before validating them, and receives until the quotas are consumed
+        """
+        self.quota.publish(requested_sessions)
+        print(f"[Controller] Published quotas {requested_sessions}")
+        idle_since = None
         while True:
-            # Exit conditions check
-            if requested_sessions:
-                if sum(requested_sessions.values()) <= 0:
-                    break
-            else:
-                if received_sessions >= minimum_number_of_sessions:
+            self._flush()
+            prepared_session = self._receive_session(self.RENDER_POLL_SECONDS)
+            if prepared_session is not None:
+                self.buffer.append(prepared_session)
+                idle_since = None
+            elif self.quota.exhausted():
+                # Sessions admitted just before exhaustion may still be queued: wait
+                # until the endpoint has been idle for a full poll period
+                if idle_since is not None:
                     break
+                idle_since = time.monotonic()
+        self._flush(force=True)
+        print(f"[Controller] Quotas consumed, {self.quota.rejected} sessions skipped")
+        self.quota.publish(None)
 
-            prepared_session_data = self.io.receive("/prepared-session")
-            prepared_session = PreparedSession(**prepared_session_data)
+    def run(self) -> None:
+        """
+        Executes the main workflow for managing session preparation and processing
+        """
+        self._collect_minimum_sessions()
 
+        # Sessions stored after the watermark (e.g. while rendering) are not part of the
+        # dataset until the watermark is moved, and are kept for the next split. The
+        # reports and the split both cover exactly the sessions with rowid <= watermark,
+        # which the database holds so that the reservoirs never evict them
+        watermark = self.sessions_db.hold_watermark()
+        while True:
+            model = DataBalancingModel(
+                balancing_tolerance=self.configuration["balancingTolerance"],
+                label_counts=self.sessions_db.count_by_label(up_to_rowid=watermark)
+            )
+            self._render_report(self.data_balancing_view, model)
+            requested_sessions = self.data_balancing_view.read_user_input(self.service_flag)
             if requested_sessions:
-                if requested_sessions.get(prepared_session.label, 0) <= 0:
-                    # Ignore the session, the user does not need it
-                    continue
-                requested_sessions[prepared_session.label] -= 1
-            else:
-                received_sessions += 1
-            self.sessions_db.store(prepared_session)
+                self._collect_requested_sessions(requested_sessions)
+                watermark = self.sessions_db.hold_watermark()
+                continue
 
-        sessions = self.sessions_db.get_all()
+            # Samples are only needed by the scatter mode of the report, used for small datasets
+            scatter = (self.sessions_db.count(up_to_rowid=watermark)
+                       <= self.configuration["coverageScatterMaxSamples"])
+            model = DataCoverageModel(
+                self.sessions_db.feature_histograms(up_to_rowid=watermark),
+                self.sessions_db.get_feature_columns(up_to_rowid=watermark) if scatter else None
+            )
+            self._render_report(self.data_coverage_view, model)
+            requested_sessions = self.data_coverage_view.read_user_input(self.service_flag)
+            if requested_sessions:
+                self._collect_requested_sessions(requested_sessions)
+                watermark = self.sessions_db.hold_watermark()
+                continue
+            break
 
-        model = DataBalancingModel(
-            balancing_tolerance=self.configuration["balancingTolerance"],
-            sessions=sessions
+        # The dataset is streamed from the database, it is never held in memory as a whole
+        splits = self.splitter.split_chunks(
+            lambda: self.sessions_db.iter_chunks(up_to_rowid=watermark)
         )
-        self.data_balancing_view.build_report(model)
-        requested_sessions = self.data_balancing_view.read_user_input(self.service_flag)
-        if requested_sessions:
-            self.run(requested_sessions)
-            return
-
-        model = DataCoverageModel(sessions)
-        self.data_coverage_view.build_report(model)
-        requested_sessions = self.data_coverage_view.read_user_input(self.service_flag)
-        if requested_sessions:
-            self.run(requested_sessions)
-            return
-
-        splits = self.splitter.split(sessions)
         self.io.send_files(self.development_system_address, "/calibration-sets", splits)
-        self.sessions_db.delete_all()
+        self.sessions_db.delete_up_to(watermark)
         self.splitter.delete(splits)
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+"""
+A compact binary columnar format for calibration sets (train/validation/test splits).
+
+A calibration set is an uncompressed ``.npz`` archive containing:
+- ``features``: a C-contiguous float32 matrix, one row per session;
+- ``labels``: int8 label codes, indexes into ``label_names``;
+- ``feature_names`` and ``label_names``: the column and label names.
+
+Label codes follow the alphabetical order of the attack risk levels, which is the
+order a LabelEncoder fitted on all the levels would produce. Since the archive is
+not compressed, its arrays can be memory mapped directly from the file.
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Final, NamedTuple
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from shared.attack_risk_level import AttackRiskLevel
+
+LABEL_NAMES: Final[tuple[str, ...]] = tuple(sorted(level.value for level in AttackRiskLevel))
+
+
+class CalibrationSet(NamedTuple):
+    """
+    The arrays stored in a calibration set file
+    """
+    features: np.ndarray
+    labels: np.ndarray
+    feature_names: list[str]
+    label_names: list[str]
+
+
+def save_calibration_set(path: str, df: pd.DataFrame) -> None:
+    """
+    Saves a DataFrame of prepared sessions (with `uuid` and `label` columns) as a
+    calibration set file. The `uuid` column is not stored
+    """
+    feature_names = [c for c in df.columns if c not in ("uuid", "label")]
+    features = np.ascontiguousarray(df[feature_names].to_numpy(dtype=np.float32))
+    labels = pd.Categorical(df["label"], categories=LABEL_NAMES).codes.astype(np.int8)
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            features=features,
+            labels=labels,
+            feature_names=np.array(feature_names),
+            label_names=np.array(LABEL_NAMES)
+        )
+
+
+class CalibrationSetWriter:
+    """
+    Writes a calibration set file chunk by chunk, so that sets larger than memory can
+    be produced. Chunks are appended to temporary raw files, which are streamed into
+    the archive members on `close`
+
+    :ivar path: The path of the calibration set file
+    :type path: str
+    :ivar feature_names: The feature columns, in the order they are stored
+    :type feature_names: list[str]
+    :ivar rows: Number of sessions written so far
+    :type rows: int
+    """
+    def __init__(self, path: str, feature_names: list[str]):
+        self.path = path
+        self.feature_names = feature_names
+        self.rows = 0
+        self._tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+        self._features = open(os.path.join(self._tmp_dir, "features.raw"), "wb")
+        self._labels = open(os.path.join(self._tmp_dir, "labels.raw"), "wb")
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        Appends a DataFrame of prepared sessions (with a `label` column) to the set
+        """
+        features = np.ascontiguousarray(df[self.feature_names].to_numpy(dtype=np.float32))
+        labels = pd.Categorical(df["label"], categories=LABEL_NAMES).codes.astype(np.int8)
+        self._features.write(features.tobytes())
+        self._labels.write(labels.tobytes())
+        self.rows += len(df)
+
+    def _write_member(self, archive: zipfile.ZipFile, name: str, raw_file, header: dict) -> None:
+        with archive.open(name, "w", force_zip64=True) as member:
+            np.lib.format.write_array_header_1_0(member, header)
+            with open(raw_file.name, "rb") as raw:
+                shutil.copyfileobj(raw, member, 2**20)
+
+    def close(self) -> None:
+        """
+        Builds the archive from the written chunks and removes the temporary files
+        """
+        self._features.close()
+        self._labels.close()
+        try:
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+                self._write_member(archive, "features.npy", self._features, {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                    "fortran_order": False,
+                    "shape": (self.rows, len(self.feature_names))
+                })
+                self._write_member(archive, "labels.npy", self._labels, {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype(np.int8)),
+                    "fortran_order": False,
+                    "shape": (self.rows,)
+                })
+                for name, values in (("feature_names", self.feature_names),
+                                     ("label_names", LABEL_NAMES)):
+                    with archive.open(f"{name}.npy", "w") as member:
+                        np.lib.format.write_array(member, np.array(values))
+        finally:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+def _memmap_member(path: str, archive: zipfile.ZipFile, name: str) -> np.ndarray:
+    """
+    Memory maps a .npy member stored without compression inside a .npz archive
+    """
+    info = archive.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"Member '{name}' of '{path}' is compressed and cannot be mapped")
+    with open(path, "rb") as f:
+        # The local file header is 30 bytes followed by the file name and extra field
+        f.seek(info.header_offset + 26)
+        name_length = int.from_bytes(f.read(2), "little")
+        extra_length = int.from_bytes(f.read(2), "little")
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        if np.lib.format.read_magic(f) == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    order = "F" if fortran_order else "C"
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype, order=order)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order=order)
+
+
+def load_calibration_set(path: str, mmap: bool = True) -> CalibrationSet:
+    """
+    Loads a calibration set file. With `mmap`, the feature and label arrays are
+    memory mapped instead of being read into memory
+    """
+    with np.load(path) as data:
+        feature_names = [str(n) for n in data["feature_names"]]
+        label_names = [str(n) for n in data["label_names"]]
+        if not mmap:
+            return CalibrationSet(data["features"], data["labels"], feature_names, label_names)
+    with zipfile.ZipFile(path) as archive:
+        features = _memmap_member(path, archive, "features.npy")
+        labels = _memmap_member(path, archive, "labels.npy")
+    return CalibrationSet(features, labels, feature_names, label_names)
@@ -0,0 +1,158 @@
+"""
+A compact export format for the trained MLP classifiers, holding only what inference
+needs, so that the classification system neither unpickles sklearn objects nor keeps
+float64 weights.
+
+A compact model is an uncompressed ``.npz`` archive containing:
+- ``weights_<i>`` and ``biases_<i>``: the parameters of layer i, float32, or int8
+  weights with a float32 ``scales_<i>`` per output unit when quantized;
+- ``activation`` and ``out_activation``: the hidden and output activation names;
+- ``feature_names``: the input features, in the order expected by the first layer;
+- ``classes``: the label of each output unit;
+- ``n_iter``: the number of training epochs, for reporting.
+"""
+
+from typing import Final
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from sklearn.neural_network import MLPClassifier
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x -= x.max(axis=1)[:, np.newaxis]
+    np.exp(x, out=x)
+    x /= x.sum(axis=1)[:, np.newaxis]
+    return x
+
+
+# Activations of the MLP layers, computed in place with the same operations as
+# MLPClassifier. Shared by CompactModel and the classification InferenceEngine
+ACTIVATIONS: Final = {
+    "identity": lambda x: x,
+    "logistic": lambda x: expit(x, out=x),
+    "tanh": lambda x: np.tanh(x, out=x),
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "softmax": _softmax
+}
+
+
+class CompactModel:
+    """
+    Forward-pass-only MLP classifier, exported from a fitted MLPClassifier.
+    Weights are held in float32 (int8 quantized weights are dequantized at load)
+
+    :ivar weights: The weight matrix of each layer
+    :type weights: list[np.ndarray]
+    :ivar biases: The bias vector of each layer
+    :type biases: list[np.ndarray]
+    :ivar activation: The hidden layers activation
+    :type activation: str
+    :ivar out_activation: The output layer activation, "softmax" or "logistic"
+    :type out_activation: str
+    :ivar feature_names_in_: The input features
+    :type feature_names_in_: np.ndarray
+    :ivar classes_: The label of each class
+    :type classes_: np.ndarray
+    :ivar n_iter_: The number of training epochs of the exported model
+    :type n_iter_: int
+    :ivar quantized: Whether the weights were stored as int8
+    :type quantized: bool
+    """
+    def __init__(self, weights, biases, activation, out_activation,
+                 feature_names, classes, n_iter, quantized=False):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.out_activation = out_activation
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.classes_ = np.asarray(classes, dtype=object)
+        self.n_iter_ = int(n_iter)
+        self.quantized = quantized
+
+    @property
+    def hidden_layer_sizes(self) -> tuple[int, ...]:
+        """
+        The number of units of each hidden layer, as in MLPClassifier
+        """
+        return tuple(w.shape[1] for w in self.weights[:-1])
+
+    @classmethod
+    def from_mlp(cls, model: MLPClassifier, class_names=None) -> "CompactModel":
+        """
+        Exports a fitted MLPClassifier. `class_names` maps each class of the model to
+        its label (by default, the label encoder stored with the model or the classes)
+        """
+        if class_names is None:
+            encoder = getattr(model, "label_encoder_", None)
+            class_names = (encoder.inverse_transform(model.classes_) if encoder is not None
+                           else model.classes_)
+        return cls(model.coefs_, model.intercepts_, model.activation, model.out_activation_,
+                   model.feature_names_in_, [str(c) for c in class_names], model.n_iter_)
+
+    def save(self, path: str, quantize: bool = False) -> None:
+        """
+        Saves the model, with int8 weights (symmetric, per output unit) if `quantize`
+        """
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            if quantize:
+                scales = np.abs(w).max(axis=0) / 127
+                scales[scales == 0] = 1
+                arrays[f"weights_{i}"] = np.round(w / scales).astype(np.int8)
+                arrays[f"scales_{i}"] = scales.astype(np.float32)
+            else:
+                arrays[f"weights_{i}"] = w
+            arrays[f"biases_{i}"] = b
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                activation=np.array(self.activation),
+                out_activation=np.array(self.out_activation),
+                feature_names=np.array(self.feature_names_in_, dtype=str),
+                classes=np.array(self.classes_, dtype=str),
+                n_iter=np.array(self.n_iter_),
+                **arrays
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "CompactModel":
+        """
+        Loads a compact model file
+        """
+        with np.load(path) as data:
+            n_layers = sum(1 for name in data.files if name.startswith("biases_"))
+            weights, biases = [], []
+            quantized = "scales_0" in data.files
+            for i in range(n_layers):
+                w = data[f"weights_{i}"].astype(np.float32)
+                if quantized:
+                    w *= data[f"scales_{i}"]
+                weights.append(w)
+                biases.append(data[f"biases_{i}"])
+            return cls(weights, biases, str(data["activation"]), str(data["out_activation"]),
+                       data["feature_names"].tolist(), data["classes"].tolist(),
+                       int(data["n_iter"]), quantized)
+
+    def predict_proba(self, x) -> np.ndarray:
+        """
+        Returns the class probabilities of a matrix (or DataFrame) of samples
+        """
+        if isinstance(x, pd.DataFrame):
+            x = x[self.feature_names_in_]
+        a = np.asarray(x, dtype=np.float32)
+        hidden = ACTIVATIONS[self.activation]
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            a = hidden(a @ w + b)
+        a = ACTIVATIONS[self.out_activation](a @ self.weights[-1] + self.biases[-1])
+        if self.out_activation == "logistic":
+            p = a.ravel()
+            return np.column_stack((1 - p, p))
+        return a
+
+    def predict(self, x) -> np.ndarray:
+        """
+        Returns the label of each sample
+        """
+        return self.classes_[np.argmax(self.predict_proba(x), axis=1)]
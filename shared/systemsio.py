@@ -8,7 +8,7 @@ import logging
 import threading
 import queue
 from contextlib import ExitStack
-from typing import Any
+from typing import Any, Callable
 
 import requests
 from flask import Flask, request, jsonify, Response
@@ -43,6 +43,9 @@ class SystemsIO:
     :type queues: dict[str, queue.Queue]
     :ivar schemas: Endpoints mapped to JSON validation schemas. Only applicable to JSON endpoints
     :type schemas: dict[str, dict[str, Any]]
+    :ivar admission_filters: Endpoints mapped to a predicate deciding, before the (costly)
+        schema validation, whether a JSON payload is accepted or skipped
+    :type admission_filters: dict[str, Callable[[Any], bool]]
     :ivar app: The Flask application instance used for the server
     :type app: Flask
     :ivar port: The port number the server listens to
@@ -57,6 +60,7 @@ class SystemsIO:
         self.host = "0.0.0.0"
         self.queues: dict[str, queue.Queue] = {}
         self.schemas: dict[str, dict[str, Any]] = {}
+        self.admission_filters: dict[str, Callable[[Any], bool]] = {}
 
         for endpoint in endpoints:
             self.app.add_url_rule(
@@ -96,6 +100,9 @@ class SystemsIO:
             path = request.path
             data = request.get_json()
             #print(f"[SystemsIO] Received JSON payload: {data}")
+            admit = self.admission_filters.get(path)
+            if admit is not None and not admit(data):
+                return jsonify({"status": "Skipped"}), 200
             schema = self.schemas.get(path)
             try:
                 validate(instance=data, schema=schema)
@@ -120,6 +127,20 @@ class SystemsIO:
         return jsonify({"error": "Unsupported Media Type. Send 'application/json'"
             " or 'multipart/form-data' with files"}), 415
 
+    def set_admission_filter(self, endpoint: str, admit: Callable[[Any], bool] | None) -> None:
+        """
+        Installs (or removes, if None) a predicate called on every JSON payload received
+        on the endpoint before schema validation. Payloads it rejects are acknowledged
+        but not queued. The predicate runs on the Flask threads
+        """
+        if endpoint not in self.queues:
+            raise ValueError(f"Endpoint '{endpoint}' is not registered. "
+                f"Available endpoints are: {list(self.queues.keys())}")
+        if admit is None:
+            self.admission_filters.pop(endpoint, None)
+        else:
+            self.admission_filters[endpoint] = admit
+
     @staticmethod
     def send_json(target: Address, endpoint: str, data: dict[str, Any]) -> None:
         """
@@ -146,13 +167,21 @@ class SystemsIO:
             requests.post(url, files=files, timeout=None).raise_for_status()
         print(f"[SystemsIO] Sent to {url} FILES: {file_paths}")
 
-    def receive(self, endpoint: str) -> dict[str, Any] | list[str]:
+    def receive(
+        self,
+        endpoint: str,
+        timeout: float | None = None
+    ) -> dict[str, Any] | list[str] | None:
         """
         Retrieve data from the specified endpoint queue.
         Data can be either a JSON object or the path of a file.
-        This method blocks indefinitely until data is available
+        This method blocks indefinitely until data is available, unless a timeout
+        (in seconds) is given: in that case None is returned if it expires
         """
         if endpoint not in self.queues:
             raise ValueError(f"Endpoint '{endpoint}' is not registered. "
                 f"Available endpoints are: {list(self.queues.keys())}")
-        return self.queues[endpoint].get(block=True)
+        try:
+            return self.queues[endpoint].get(block=True, timeout=timeout)
+        except queue.Empty:
+            return None
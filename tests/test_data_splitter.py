@@ -0,0 +1,108 @@
+"""
+Tests of the streaming stratified split of segregation_system/data_splitter.py,
+and of the split percentages passed to it by the segregation system controller
+"""
+
+import random
+import uuid
+
+import pandas as pd
+import pytest
+
+from segregation_system import segregation_system_controller as controller_module
+from segregation_system.data_splitter import DataSplitter
+
+# Distinct percentages, so that swapping any two of them is detected
+PERCENTAGES = {"train": 0.6, "validation": 0.3, "test": 0.1}
+LABEL_SIZES = {"normal": 2500, "moderate": 1500, "high": 700}
+CHUNK_SIZE = 650
+
+# Each cut point is the hash bin boundary closest to its target, so a split differs
+# from its percentage by at most one bin per cut: a few sessions for these sizes, while
+# an unstratified random split is off by about 8 sessions (one standard deviation)
+TOLERANCE_SESSIONS = 4
+
+
+def _sessions(seed: int) -> pd.DataFrame:
+    rng = random.Random(seed)
+    labels = [label for label, size in LABEL_SIZES.items() for _ in range(size)]
+    rng.shuffle(labels)
+    return pd.DataFrame({
+        "uuid": [str(uuid.UUID(int=rng.getrandbits(128))) for _ in labels],
+        "mad_timestamps": [rng.uniform(0, 600) for _ in labels],
+        "median_longitude": [rng.uniform(-180, 180) for _ in labels],
+        "label": labels
+    })
+
+
+def _chunks(dataset: pd.DataFrame, chunk_size: int = CHUNK_SIZE):
+    return lambda: (dataset.iloc[i:i + chunk_size] for i in range(0, len(dataset), chunk_size))
+
+
+def _split(tmp_path, dataset: pd.DataFrame, chunk_size: int = CHUNK_SIZE) -> dict:
+    splitter = DataSplitter(*PERCENTAGES.values(), str(tmp_path), "csv")
+    paths = splitter.split_chunks(_chunks(dataset, chunk_size))
+    return {
+        name: pd.read_csv(path)
+        for name, path in zip(DataSplitter.SPLIT_NAMES, paths, strict=True)
+    }
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_label_ratios_within_tolerance(tmp_path, seed):
+    splits = _split(tmp_path, _sessions(seed))
+    assert sum(len(split) for split in splits.values()) == sum(LABEL_SIZES.values())
+    for label, size in LABEL_SIZES.items():
+        for name, split in splits.items():
+            count = (split["label"] == label).sum()
+            assert abs(count - PERCENTAGES[name] * size) <= TOLERANCE_SESSIONS, (label, name)
+
+
+def test_split_independent_of_chunking_and_order(tmp_path):
+    dataset = _sessions(0)
+    splits = _split(tmp_path / "a", dataset)
+    shuffled = dataset.sample(frac=1, random_state=1)
+    other = _split(tmp_path / "b", shuffled, chunk_size=97)
+    for name in DataSplitter.SPLIT_NAMES:
+        assert set(splits[name]["uuid"]) == set(other[name]["uuid"])
+
+
+class _OfflineIO:
+    def __init__(self, *_):
+        pass
+
+    def set_admission_filter(self, *_):
+        pass
+
+
+def test_controller_passes_percentages_in_order(monkeypatch):
+    configuration = {
+        "serviceFlag": False,
+        "addresses": {
+            "developmentSystem": {"ip": "127.0.0.1", "port": 0},
+            "segregationSystem": {"ip": "127.0.0.1", "port": 0}
+        },
+        "databaseSynchronous": "NORMAL",
+        "coverageHistogramBins": 20,
+        "reservoirMaxSessionsPerLabel": 0,
+        "trainSplitPercentage": PERCENTAGES["train"],
+        "validationSplitPercentage": PERCENTAGES["validation"],
+        "testSplitPercentage": PERCENTAGES["test"],
+        "calibrationSetFormat": "csv",
+        "calibrationSetSource": "default",
+        "coverageScatterMaxSamples": 0,
+        "reportRenderTimeoutSeconds": 1,
+        "storeFlushCount": 1,
+        "storeFlushIntervalSeconds": 1
+    }
+    # Neither a server, a database nor a renderer process is needed to build the splitter
+    monkeypatch.setattr(controller_module, "load_and_validate_json_file",
+                        lambda *_: dict(configuration))
+    monkeypatch.setattr(controller_module, "SystemsIO", _OfflineIO)
+    monkeypatch.setattr(controller_module, "PreparedSessionsDB", lambda **_: None)
+    monkeypatch.setattr(controller_module, "ReportRenderer", lambda: None)
+
+    splitter = controller_module.SegregationSystemController().splitter
+    assert splitter.train_split_percentage == PERCENTAGES["train"]
+    assert splitter.validation_split_percentage == PERCENTAGES["validation"]
+    assert splitter.test_split_percentage == PERCENTAGES["test"]
@@ -0,0 +1,113 @@
+"""
+Tests of the exact and P² median/MAD estimators of the preparation system,
+and of the error bounds documented in preparation_system/streaming_statistics.py
+"""
+
+import statistics
+
+import numpy as np
+import pytest
+
+from preparation_system import streaming_statistics as ss
+
+THRESHOLD = 100
+DISTRIBUTIONS = ("normal", "uniform", "exponential", "lognormal")
+
+
+def _sample(distribution: str, n: int, seed: int) -> list[float]:
+    rng = np.random.default_rng(seed)
+    return getattr(rng, distribution)(size=n).tolist()
+
+
+def _exact_mad(values: list[float]) -> float:
+    m = statistics.median(values)
+    return statistics.median([abs(v - m) for v in values])
+
+
+def _rank_error(values: list[float], estimate: float) -> float:
+    """
+    Distance between 0.5 and the fraction of values below the estimate
+    """
+    return abs(float(np.mean(np.asarray(values) < estimate)) - 0.5)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 10, 51, THRESHOLD - 1, THRESHOLD])
+@pytest.mark.parametrize("seed", range(5))
+def test_exact_below_threshold(n, seed):
+    values = _sample("normal", n, seed)
+    assert ss.median(values, THRESHOLD) == statistics.median(values)
+    assert ss.mad(values, THRESHOLD) == pytest.approx(_exact_mad(values), abs=1e-12)
+
+
+def test_exact_median_with_duplicates_and_integers():
+    values = [3, 1, 2, 2, 5, 2, 8, 1]
+    assert ss.exact_median(values) == statistics.median(values)
+    assert ss.mad(values, THRESHOLD) == _exact_mad(values)
+
+
+def test_empty_sequence():
+    assert ss.median([], THRESHOLD) == 0.0
+    assert ss.mad([], THRESHOLD) == 0.0
+    assert ss.approximate_median([]) == 0.0
+
+
+@pytest.mark.parametrize("n", [1, 2, 4, 5])
+def test_p2_exact_up_to_five_values(n):
+    values = _sample("uniform", n, 0)
+    assert ss.approximate_median(values) == pytest.approx(statistics.median(values))
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_p2_estimate_within_observed_range(distribution):
+    values = _sample(distribution, 2000, 1)
+    assert min(values) <= ss.approximate_median(values) <= max(values)
+
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+@pytest.mark.parametrize("n", [1000, 3000, 10000])
+@pytest.mark.parametrize("seed", range(3))
+def test_p2_error_bounds(distribution, n, seed):
+    values = _sample(distribution, n, seed)
+    assert ss.monotone_direction(values) == 0
+    assert _rank_error(values, ss.median(values, THRESHOLD)) < 0.02
+    exact_mad = _exact_mad(values)
+    assert abs(ss.mad(values, THRESHOLD) - exact_mad) / exact_mad < 0.05
+
+
+@pytest.mark.parametrize("distribution", ("normal", "uniform"))
+@pytest.mark.parametrize("seed", range(3))
+def test_p2_tighter_bounds_on_normal_and_uniform(distribution, seed):
+    values = _sample(distribution, 3000, seed)
+    assert _rank_error(values, ss.median(values, THRESHOLD)) <= 0.011
+    exact_mad = _exact_mad(values)
+    assert abs(ss.mad(values, THRESHOLD) - exact_mad) / exact_mad < 0.025
+
+
+@pytest.mark.parametrize("n", [THRESHOLD + 1, 1000, 3000, 3001])
+@pytest.mark.parametrize("descending", [False, True])
+def test_monotone_sequences_are_exact(n, descending):
+    values = sorted(_sample("normal", n, 2), reverse=descending)
+    assert ss.median(values, THRESHOLD) == pytest.approx(statistics.median(values))
+    assert ss.mad(values, THRESHOLD) == pytest.approx(_exact_mad(values))
+
+
+def test_timestamps_are_exact():
+    rng = np.random.default_rng(3)
+    timestamps = np.cumsum(rng.exponential(1000, size=5000)).astype(int).tolist()
+    assert ss.median(timestamps, THRESHOLD) == pytest.approx(statistics.median(timestamps))
+    assert ss.mad(timestamps, THRESHOLD) == pytest.approx(_exact_mad(timestamps))
+
+
+def test_monotone_with_ties_and_constant():
+    values = sorted([1.0] * 300 + [2.0] * 500 + [7.0] * 201)
+    assert ss.median(values, THRESHOLD) == statistics.median(values)
+    assert ss.mad(values, THRESHOLD) == _exact_mad(values)
+    constant = [4.0] * 1000
+    assert ss.median(constant, THRESHOLD) == 4.0
+    assert ss.mad(constant, THRESHOLD) == 0.0
+
+
+def test_monotone_direction():
+    assert ss.monotone_direction([1, 2, 2, 3]) == 1
+    assert ss.monotone_direction([3, 2, 2, 1]) == -1
+    assert ss.monotone_direction([1, 3, 2]) == 0